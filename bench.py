@@ -0,0 +1,284 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from catalog_index import CatalogIndex
+from catalog_scan import scan_catalog
+from category_store import CATEGORY_NAMES, CategoryStore, write_json_atomic
+from ordered_view import CategoryViews
+from sale_index import SaleIndex, narrows
+from sale_store import build_store, load_cache, save_cache
+from search_sale_items import search_items
+from thumbnail_cache import THUMB_SIZE, ThumbnailCache, make_thumbnail
+
+YEARS = [str(year) for year in range(1982, 1995)]
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp')
+SCALES = {
+    # images, listings, users
+    'small': (500, 10000, 3),
+    'medium': (5000, 100000, 10),
+    'large': (20000, 1000000, 50),
+}
+NAME_PARTS = ['Snake', 'Eyes', 'Duke', 'Scarlett', 'Cobra', 'Commander', 'Destro', 'Roadblock', 'Flint',
+              'Lady', 'Jaye', 'Storm', 'Shadow', 'Gung', 'Ho', 'Baroness', 'Zartan', 'Stalker', 'Shipwreck',
+              'Sgt', 'Slaughter', 'Firefly', 'Beach', 'Head', 'Wild', 'Bill', 'Major', 'Bludd', 'Recondo']
+WEAPONS = ['Uzi', 'Sword', 'Rifle', 'Backpack', 'Helmet', 'Pistol', 'Bazooka', 'Knife']
+VEHICLES = ['', '', '', 'HISS Tank', 'Skystriker', 'VAMP', 'MOBAT', 'Dragonfly']
+TYPED_QUERY = 'snake eyes'
+DECODE_SAMPLE = 50
+CATEGORIZE_OPS = 50
+
+
+def figure_name(rng):
+    return ' '.join(rng.sample(NAME_PARTS, rng.randint(1, 3)))
+
+
+def generate_catalog(base_dir, images, image_size=(1024, 768), seed=0):
+    # Year folders of real JPEGs plus a figures.json describing them
+    from PIL import Image, ImageDraw
+    rng = random.Random(seed)
+    figure_meta = {}
+    for i in range(images):
+        year = YEARS[i % len(YEARS)]
+        folder = os.path.join(base_dir, year)
+        os.makedirs(folder, exist_ok=True)
+        name = f'figure_{i:06d}.jpg'
+        img = Image.new('RGB', image_size, tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(4):
+            x, y = rng.randrange(image_size[0] // 2), rng.randrange(image_size[1] // 2)
+            draw.rectangle([x, y, x + rng.randrange(10, image_size[0] // 2), y + rng.randrange(10, image_size[1] // 2)],
+                           fill=tuple(rng.randrange(256) for _ in range(3)))
+        img.save(os.path.join(folder, name), quality=85)
+        figure_meta[f'{year}/{name}'] = {
+            'id': f'GIJ-{i:06d}',
+            'name': figure_name(rng),
+            'year': int(year),
+            'weapons': rng.sample(WEAPONS, rng.randint(0, 3)),
+            'vehicle': rng.choice(VEHICLES),
+        }
+    figures_path = os.path.join(base_dir, 'figures.json')
+    with open(figures_path, 'w') as f:
+        json.dump(figure_meta, f)
+    return figures_path
+
+
+def generate_users(users_dir, image_paths, users, seed=0):
+    # Category snapshots for `users` collectors, each touching a third of the catalog
+    rng = random.Random(seed)
+    usernames = []
+    for u in range(users):
+        username = f'user{u:03d}'
+        user_dir = os.path.join(users_dir, username)
+        os.makedirs(user_dir, exist_ok=True)
+        picked = rng.sample(image_paths, len(image_paths) // 3)
+        for i, cat in enumerate(CATEGORY_NAMES):
+            write_json_atomic(os.path.join(user_dir, f'{cat}.json'), picked[i::3])
+        usernames.append(username)
+    return usernames
+
+
+def generate_listings(path, count, seed=0):
+    # sale_items.json as one JSON array, written a chunk at a time
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        f.write('[\n')
+        for start in range(0, count, 10000):
+            rows = []
+            for i in range(start, min(start + 10000, count)):
+                name = f'{figure_name(rng)} {rng.choice(YEARS)} {rng.choice(["MOC", "loose", "complete", "mint"])}'
+                rows.append(json.dumps({
+                    'id': i,
+                    'name': name,
+                    'price': f'{rng.uniform(1, 500):.2f}',
+                    'description': f'Listing {i}: {name}',
+                    'image': f'item_{i}.jpg' if rng.random() < 0.5 else '',
+                }))
+            f.write((',\n' if start else '') + ',\n'.join(rows))
+        f.write('\n]\n')
+
+
+class Bench:
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = {}
+
+    def time(self, name, func, setup=None, ops=1, repeat=None):
+        # min/median/mean/max over `repeat` runs; ops turns each run into a per-op time
+        runs = []
+        for _ in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+            gc.collect()
+            start = time.perf_counter()
+            func()
+            runs.append((time.perf_counter() - start) / ops)
+        self.results[name] = {
+            'runs': len(runs),
+            'ops': ops,
+            'min_s': min(runs),
+            'median_s': statistics.median(runs),
+            'mean_s': statistics.fmean(runs),
+            'max_s': max(runs),
+        }
+        print(f'{name:28s} {statistics.median(runs) * 1000:10.3f} ms', file=sys.stderr)
+
+
+def run(workdir, images, listings, users, repeat, image_size):
+    bench = Bench(repeat)
+    base_dir = os.path.join(workdir, 'catalog')
+    users_dir = os.path.join(workdir, 'users')
+    cache_dir = os.path.join(workdir, 'cache')
+    manifest = os.path.join(cache_dir, 'catalog_manifest.json')
+    sale_path = os.path.join(workdir, 'sale_items.json')
+
+    print(f'generating {images} images, {listings} listings, {users} users in {workdir}', file=sys.stderr)
+    figures_path = generate_catalog(base_dir, images, image_size)
+    generate_listings(sale_path, listings)
+
+    # Catalog: load_all_images cold (no manifest) and warm (unchanged folders)
+    def drop_manifest():
+        if os.path.exists(manifest):
+            os.remove(manifest)
+    bench.time('load_all_images_cold', lambda: scan_catalog(base_dir, YEARS, EXTENSIONS, manifest), setup=drop_manifest)
+    scan_catalog(base_dir, YEARS, EXTENSIONS, manifest)
+    bench.time('load_all_images_warm', lambda: scan_catalog(base_dir, YEARS, EXTENSIONS, manifest))
+    image_paths = scan_catalog(base_dir, YEARS, EXTENSIONS, manifest)
+    usernames = generate_users(users_dir, image_paths, users)
+
+    def load_figures():
+        with open(figures_path) as f:
+            return json.load(f)
+    bench.time('load_figure_metadata', load_figures)
+    figure_meta = load_figures()
+
+    # display_image: decode + scale of a full image, then the thumbnail cache hit
+    sample = image_paths[:DECODE_SAMPLE]
+    bench.time('display_image_decode', lambda: [make_thumbnail(p, THUMB_SIZE).load() for p in sample], ops=len(sample))
+    thumbs = ThumbnailCache(cache_dir)
+    for p in sample:
+        thumbs.get(p, THUMB_SIZE)
+    bench.time('display_image_cached', lambda: [thumbs.get(p, THUMB_SIZE) for p in sample], ops=len(sample))
+    thumbs.close()
+
+    # Categories
+    store = CategoryStore(usernames[0], users_dir=users_dir)
+    bench.time('load_categories', store.load)
+    categories = store.load()
+
+    def categorize():
+        for p in image_paths[:CATEGORIZE_OPS]:
+            store.assign([p], 'want')
+            store.flush()
+    bench.time('save_categories', categorize, ops=CATEGORIZE_OPS)
+
+    def build_catalog():
+        catalog = CatalogIndex(base_dir)
+        catalog.add(image_paths)
+        catalog.set_metadata(figure_meta)
+        catalog.set_categories(categories)
+        return catalog
+    bench.time('catalog_index_build', build_catalog)
+    catalog = build_catalog()
+    bench.time('refresh_want_list', lambda: CategoryViews(list(image_paths), categories))
+
+    for label, keys in (('year', ('year',)), ('name', ('name',)), ('category', ('category',)),
+                        ('year_name', ('year', 'name'))):
+        bench.time(f'sort_by_{label}', lambda keys=keys: catalog.sorted_paths(keys), setup=catalog.perms.clear)
+        bench.time(f'sort_by_{label}_cached', lambda keys=keys: catalog.sorted_paths(keys))
+
+    # Sale items: streaming parse, mmap cache load, index build and searches
+    bench.time('sale_items_parse', lambda: build_store(sale_path))
+    store_cache = os.path.join(cache_dir, 'sale_items.bin')
+    save_cache(build_store(sale_path), store_cache)
+    bench.time('sale_items_cached_load', lambda: load_cache(sale_path, store_cache).close())
+    items = load_cache(sale_path, store_cache)
+    bench.time('sale_index_build', lambda: SaleIndex(items))
+    index = SaleIndex(items)
+    queries = [('snake', None, None), (None, 10.0, 50.0), ('cobra commander', 5.0, 100.0), ('zzz', None, None)]
+    bench.time('search_items', lambda: [search_items(index, *q) for q in queries], ops=len(queries))
+
+    def type_query():
+        # update_filter for each keystroke of TYPED_QUERY, refining while the query narrows
+        last, ids = (None, None, None), list(range(len(items)))
+        for end in range(1, len(TYPED_QUERY) + 1):
+            query = (TYPED_QUERY[:end].strip() or None, None, None)
+            ids = index.refine(ids, *query) if narrows(last, query) else index.search(*query)
+            last = query
+    bench.time('update_filter', type_query, ops=len(TYPED_QUERY))
+    items.close()
+    return bench.results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    for name, row in results.items():
+        old = baseline.get(name)
+        if old:
+            ratio = row['median_s'] / old['median_s'] if old['median_s'] else float('inf')
+            flag = '  SLOWER' if ratio > 1.2 else ''
+            print(f'{name:28s} {ratio:6.2f}x{flag}', file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the catalog and sale-item hot paths on synthetic data.')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--images', type=int, help='override the number of catalog images')
+    parser.add_argument('--listings', type=int, help='override the number of sale listings')
+    parser.add_argument('--users', type=int, help='override the number of users')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--image-size', type=int, nargs=2, default=(1024, 768), metavar=('W', 'H'))
+    parser.add_argument('--workdir', help='where to generate data (default: a temp dir removed afterwards)')
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    parser.add_argument('--compare', help='earlier results JSON to print speed ratios against')
+    args = parser.parse_args(argv)
+
+    images, listings, users = SCALES[args.scale]
+    images = args.images or images
+    listings = args.listings or listings
+    users = args.users or users
+    workdir = args.workdir or tempfile.mkdtemp(prefix='gijoe-bench-')
+    try:
+        results = run(workdir, images, listings, users, args.repeat, tuple(args.image_size))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {'scale': args.scale, 'images': images, 'listings': listings, 'users': users, 'repeat': args.repeat,
+                   'image_size': list(args.image_size)},
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
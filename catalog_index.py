@@ -0,0 +1,118 @@
+import os
+
+CATEGORY_CODES = {'want': 0, 'have': 1, 'dont_want': 2}
+UNCATEGORIZED = 3
+
+
+class CatalogRecord:
+    __slots__ = ('index', 'path', 'rel_path', 'meta', 'year', 'name', 'category')
+
+    def __init__(self, index, path, rel_path):
+        self.index = index
+        self.path = path
+        self.rel_path = rel_path
+        self.meta = None
+        self.year = 0
+        self.name = ''
+        self.category = UNCATEGORIZED
+
+
+class CatalogIndex:
+    # One record per image with the per-path work (relpath, metadata lookup,
+    # category probe) done once, plus cached sort permutations per key tuple
+    def __init__(self, base_dir, figure_meta=None):
+        self.base_dir = base_dir
+        self.records = []
+        self.by_path = {}
+        self.figure_meta = figure_meta or {}
+        self.perms = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def rel_path(self, path):
+        return os.path.relpath(path, self.base_dir).replace('\\', '/')
+
+    def _fill_meta(self, rec):
+        meta = self.figure_meta.get(rec.rel_path)
+        rec.meta = meta
+        rec.year = meta.get('year', 0) if meta else 0
+        rec.name = meta.get('name', '') if meta else ''
+
+    def add(self, paths):
+        for path in paths:
+            if path in self.by_path:
+                continue
+            rec = CatalogRecord(len(self.records), path, self.rel_path(path))
+            self._fill_meta(rec)
+            self.by_path[path] = rec
+            self.records.append(rec)
+        self.perms.clear()
+
+    def remove(self, paths):
+        # Record indexes are renumbered, so index-keyed structures built on
+        # the catalog (facet bitsets) have to be rebuilt afterwards
+        gone = {path for path in paths if self.by_path.pop(path, None) is not None}
+        if not gone:
+            return
+        self.records = [rec for rec in self.records if rec.path not in gone]
+        for i, rec in enumerate(self.records):
+            rec.index = i
+        self.perms.clear()
+
+    def set_metadata(self, figure_meta):
+        self.figure_meta = figure_meta or {}
+        for rec in self.records:
+            self._fill_meta(rec)
+        self.perms.clear()
+
+    def update_metadata(self, figure_meta, rel_paths):
+        # Refill only the records whose figures.json entry changed
+        self.figure_meta = figure_meta or {}
+        for rec in self.records:
+            if rec.rel_path in rel_paths:
+                self._fill_meta(rec)
+        self._drop_perms('year')
+        self._drop_perms('name')
+
+    def set_categories(self, categories):
+        for rec in self.records:
+            rec.category = UNCATEGORIZED
+        for cat, code in CATEGORY_CODES.items():
+            for path in categories.get(cat, ()):
+                rec = self.by_path.get(path)
+                if rec is not None:
+                    rec.category = code
+        self._drop_perms('category')
+
+    def set_category(self, path, category):
+        rec = self.by_path.get(path)
+        if rec is None:
+            return
+        code = CATEGORY_CODES.get(category, UNCATEGORIZED)
+        if rec.category != code:
+            rec.category = code
+            self._drop_perms('category')
+
+    def _drop_perms(self, field):
+        for keys in [k for k in self.perms if field in k]:
+            del self.perms[keys]
+
+    def record(self, path):
+        return self.by_path.get(path)
+
+    def permutation(self, keys):
+        perm = self.perms.get(keys)
+        if perm is None:
+            records = self.records
+            if len(keys) == 1:
+                field = keys[0]
+                perm = sorted(range(len(records)), key=lambda i: getattr(records[i], field))
+            else:
+                perm = sorted(range(len(records)), key=lambda i: tuple(getattr(records[i], f) for f in keys))
+            self.perms[keys] = perm
+        return perm
+
+    def sorted_paths(self, keys):
+        records = self.records
+        return [records[i].path for i in self.permutation(keys)]
@@ -0,0 +1,87 @@
+import json
+import os
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from thumbnail_cache import CACHE_DIR
+
+MANIFEST_FILE = os.path.join(CACHE_DIR, 'catalog_manifest.json')
+MANIFEST_VERSION = 1
+SCAN_WORKERS = 8
+# Directories modified this recently may still change within the same mtime
+# tick, so their listing is not trusted on the next start
+RACY_WINDOW_NS = 2 * 10**9
+
+
+def load_manifest(manifest_path=MANIFEST_FILE):
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    except Exception:
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest.get('dirs', {})
+
+
+def save_manifest(dirs, manifest_path=MANIFEST_FILE):
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': MANIFEST_VERSION, 'dirs': dirs}, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def list_folder(folder, extensions):
+    with os.scandir(folder) as it:
+        return [entry.name for entry in it if entry.name.lower().endswith(extensions)]
+
+
+def _scan_folder(folder, extensions, cached, started_ns):
+    try:
+        st = os.stat(folder)
+    except OSError:
+        return None, False
+    if not stat.S_ISDIR(st.st_mode):
+        return None, False
+    if cached and cached.get('mtime_ns') == st.st_mtime_ns:
+        return cached, False
+    try:
+        entries = list_folder(folder, extensions)
+    except OSError:
+        return None, False
+    mtime_ns = st.st_mtime_ns if started_ns - st.st_mtime_ns > RACY_WINDOW_NS else None
+    return {'mtime_ns': mtime_ns, 'entries': entries}, True
+
+
+def iter_catalog(base_dir, year_folders, extensions, manifest_path=MANIFEST_FILE, workers=SCAN_WORKERS):
+    # Yields (folder, image paths) in year_folders order; only directories whose
+    # mtime changed since the last run are listed again
+    cached_dirs = load_manifest(manifest_path)
+    started_ns = time.time_ns()
+    folders = [os.path.join(base_dir, year) for year in year_folders]
+    dirs = {}
+    changed = False
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(folders)))) as executor:
+        futures = [executor.submit(_scan_folder, folder, extensions, cached_dirs.get(folder), started_ns)
+                   for folder in folders]
+        for folder, future in zip(folders, futures):
+            record, relisted = future.result()
+            changed = changed or relisted
+            if record is None:
+                continue
+            dirs[folder] = record
+            yield folder, [os.path.join(folder, name) for name in record['entries']]
+    if changed or dirs.keys() != cached_dirs.keys():
+        try:
+            save_manifest(dirs, manifest_path)
+        except OSError:
+            pass
+
+
+def scan_catalog(base_dir, year_folders, extensions, manifest_path=MANIFEST_FILE, workers=SCAN_WORKERS):
+    image_paths = []
+    for _, paths in iter_catalog(base_dir, year_folders, extensions, manifest_path, workers):
+        image_paths.extend(paths)
+    return image_paths
@@ -0,0 +1,455 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from catalog_index import CatalogIndex
+from catalog_scan import scan_catalog
+from category_store import CATEGORY_NAMES, USERS_DIR, CategoryStore
+from instrument import count, timer
+from sale_index import SaleIndex
+from sale_store import StaleSourceError, load_sale_store
+from search_sale_items import SORT_KEYS, sort_ids
+from thumbnail_cache import THUMB_SIZE, ThumbnailCache, thumbnail_key
+
+# Local catalog/search service: one process holds the catalog, figures.json,
+# the sale-item index and the thumbnail cache, and GUIs or scripts on the same
+# machine query it over HTTP/JSON instead of loading everything themselves.
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_BODY = 16 * 1024 * 1024
+MAX_PAGE = 5000
+MAX_THUMB = 2048
+SEARCH_CACHE = 32
+# Threads rather than cores: handlers mostly wait on disk and fsync, and a
+# slow search must leave workers free for the other clients
+WORKERS = 8
+USERNAME_RE = re.compile(r'^[\w][\w .-]{0,63}$')
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 409: 'Conflict',
+               413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _int(params, name, default=None):
+    try:
+        return int(params[name]) if name in params else default
+    except ValueError:
+        raise HTTPError(400, f'{name} must be an integer')
+
+
+def _float(params, name):
+    try:
+        return float(params[name]) if params.get(name) else None
+    except ValueError:
+        raise HTTPError(400, f'{name} must be a number')
+
+
+class SaleListings:
+    # One load of sale_items.json with its index and search cache. Requests
+    # hold it while they read, so a reload closes the old store only once the
+    # last request using it is done.
+    def __init__(self, items):
+        self.items = items
+        self.index = SaleIndex(items)
+        self.searches = OrderedDict()  # (name, min, max, sort, desc) -> result ids
+        self.readers = 0
+        self.retired = False
+
+    def close(self):
+        if hasattr(self.items, 'close'):
+            self.items.close()
+
+
+class CatalogService:
+    def __init__(self, base_dir, year_folders, extensions, figures_path, sale_items_path,
+                 users_dir=USERS_DIR, thumb_cache=None):
+        self.base_dir = base_dir
+        self.year_folders = year_folders
+        self.extensions = extensions
+        self.figures_path = figures_path
+        self.sale_items_path = sale_items_path
+        self.users_dir = users_dir
+        self.thumbs = thumb_cache
+        self.catalog = None
+        self.figure_meta = {}
+        self.facet_index = None
+        self.listings = SaleListings([])
+        self.stores = {}  # username -> CategoryStore, loaded on first use
+        self.user_locks = {}  # username -> lock serialising that user's requests
+        # Handlers run on the worker pool; this guards the shared state above
+        self.lock = threading.Lock()
+        self.facet_lock = threading.Lock()
+        self.reload_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='service')
+
+    def load(self):
+        # Blocking: run once before serving
+        try:
+            with open(self.figures_path, 'r') as f:
+                self.figure_meta = json.load(f)
+        except Exception:
+            self.figure_meta = {}
+        self.catalog = CatalogIndex(self.base_dir, self.figure_meta)
+        self.catalog.add(scan_catalog(self.base_dir, self.year_folders, self.extensions))
+        self.load_sale_items()
+        if self.thumbs is None:
+            self.thumbs = ThumbnailCache()
+
+    def load_sale_items(self, stale=None):
+        # With `stale`, reloads only if those listings are still the current
+        # ones, so concurrent requests that hit the same change reload once
+        with self.reload_lock:
+            if stale is not None and self.listings is not stale:
+                return
+            try:
+                items = load_sale_store(self.sale_items_path)
+            except Exception:
+                items = []
+            listings = SaleListings(items)
+            with self.lock:
+                old, self.listings = self.listings, listings
+                old.retired = True
+                idle = not old.readers
+        if idle:
+            old.close()
+
+    def acquire_listings(self):
+        with self.lock:
+            listings = self.listings
+            listings.readers += 1
+        return listings
+
+    def release_listings(self, listings):
+        with self.lock:
+            listings.readers -= 1
+            idle = listings.retired and not listings.readers
+        if idle:
+            listings.close()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for store in self.stores.values():
+            store.close()
+        self.listings.close()
+        if self.thumbs is not None:
+            self.thumbs.close()
+
+    def user_store(self, username):
+        # (store, lock); hold the lock while using the store
+        if not USERNAME_RE.match(username) or '..' in username:
+            raise HTTPError(400, 'invalid username')
+        with self.lock:
+            lock = self.user_locks.setdefault(username, threading.Lock())
+            store = self.stores.get(username)
+        if store is None:
+            with lock:
+                store = self.stores.get(username)
+                if store is None:
+                    # Written on the user's behalf: the store's sets follow
+                    # what the user's app writes whenever it compacts
+                    store = CategoryStore(username, users_dir=self.users_dir, owner=False)
+                    store.load()
+                    with self.lock:
+                        self.stores[username] = store
+        return store, lock
+
+    # --- request handling ---
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode('latin-1').split()
+                except ValueError:
+                    await self.respond(writer, 400, {'error': 'malformed request line'}, keep_alive=False)
+                    break
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = header.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get('content-length') or 0)
+                    if length < 0:
+                        raise ValueError
+                except ValueError:
+                    await self.respond(writer, 400, {'error': 'bad Content-Length'}, keep_alive=False)
+                    break
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {'error': 'request body too large'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                count('service.requests')
+                try:
+                    with timer('service.request'):
+                        status, payload = 200, await self.dispatch(method, target, body)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except Exception as e:
+                    status, payload = 500, {'error': f'{type(e).__name__}: {e}'}
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive=True):
+        if isinstance(payload, tuple):
+            content_type, data = payload
+        else:
+            content_type, data = 'application/json', json.dumps(payload).encode('utf-8')
+        head = (f'HTTP/1.1 {status} {STATUS_TEXT.get(status, "")}\r\n'
+                f'Content-Type: {content_type}\r\n'
+                f'Content-Length: {len(data)}\r\n'
+                f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+        writer.write(head.encode('latin-1') + data)
+        await writer.drain()
+
+    async def run(self, func, *args):
+        # Handlers read files, fsync and sort, so they run on the worker pool
+        # and one slow request doesn't hold up the other clients
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [unquote(p) for p in url.path.strip('/').split('/') if p]
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            raise HTTPError(400, 'body is not JSON')
+        route = (method, tuple(parts[:1]), len(parts))
+        if route == ('GET', ('health',), 1):
+            return self.health()
+        if route == ('GET', ('catalog',), 1):
+            return await self.run(self.catalog_page, params)
+        if route == ('GET', ('figures',), 1):
+            return self.figure_meta
+        if route == ('GET', ('facets',), 1):
+            return await self.run(self.facet_values)
+        if route == ('POST', ('facets',), 1):
+            return await self.run(self.facet_query, data)
+        if route == ('GET', ('sale',), 2) and parts[1] == 'search':
+            return await self.run(self.sale_search, params)
+        if route == ('GET', ('sale',), 3) and parts[1] == 'item':
+            return await self.run(self.sale_item, parts[2])
+        if route == ('GET', ('thumbnail',), 1):
+            return await self.thumbnail(params)
+        if parts[:1] == ['users'] and len(parts) == 3 and parts[2] == 'categories':
+            if method == 'GET':
+                return await self.run(self.categories, parts[1])
+            if method == 'POST':
+                return await self.run(self.assign, parts[1], data)
+            raise HTTPError(405, 'use GET or POST')
+        raise HTTPError(404, f'no route for {method} {url.path}')
+
+    # --- endpoints ---
+
+    def health(self):
+        with self.lock:
+            users = sorted(self.stores)
+        return {'ok': True, 'base_dir': self.base_dir, 'images': len(self.catalog), 'figures': len(self.figure_meta),
+                'sale_items': len(self.listings.items), 'users_loaded': users}
+
+    def catalog_page(self, params):
+        # Paths in load order or sorted by a comma list of year/name keys
+        sort = tuple(k for k in params.get('sort', '').split(',') if k)
+        if any(k not in ('year', 'name') for k in sort):
+            raise HTTPError(400, 'sort keys are year and name')
+        paths = self.catalog.sorted_paths(sort) if sort else [rec.path for rec in self.catalog.records]
+        offset = _int(params, 'offset', 0)
+        limit = _int(params, 'limit')
+        page = paths[offset:offset + limit] if limit is not None else paths[offset:]
+        return {'total': len(paths), 'offset': offset, 'paths': page}
+
+    def facets(self):
+        with self.facet_lock:
+            if self.facet_index is None:
+                from facets import FacetIndex
+                self.facet_index = FacetIndex(self.catalog)
+        return self.facet_index
+
+    def facet_values(self):
+        return self.facets().values()
+
+    def facet_query(self, data):
+        # Year/weapon/vehicle facets come from the shared bitsets; categories
+        # are per user, so they are applied against that user's sets
+        sort = tuple(data.get('sort') or ()) or None
+        if sort and any(k not in ('year', 'name') for k in sort):
+            raise HTTPError(400, 'sort keys are year and name')
+        paths = self.facets().filter_paths(sort, years=data.get('years'), weapons=data.get('weapons'),
+                                           vehicle=data.get('vehicle'))
+        include, exclude = data.get('categories'), data.get('exclude_categories')
+        if include or exclude:
+            if not data.get('user'):
+                raise HTTPError(400, 'category facets need a user')
+            store, lock = self.user_store(data['user'])
+            categories = store.categories
+
+            def category_of(path):
+                for cat in CATEGORY_NAMES:
+                    if path in categories[cat]:
+                        return cat
+                return 'none'
+            with lock:
+                paths = [p for p in paths
+                         if (not include or category_of(p) in include) and not (exclude and category_of(p) in exclude)]
+        return {'total': len(paths), 'paths': paths}
+
+    def categories(self, username):
+        store, lock = self.user_store(username)
+        with lock:
+            return {cat: sorted(store.categories[cat]) for cat in CATEGORY_NAMES}
+
+    def assign(self, username, data):
+        # Body is a list of journal records, {'cat': category or null, 'paths': [...]};
+        # they are applied in order and written with one fsync
+        records = data.get('records')
+        if not isinstance(records, list):
+            raise HTTPError(400, 'records must be a list')
+        for record in records:
+            if not isinstance(record, dict) or (record.get('cat') is not None and record.get('cat') not in CATEGORY_NAMES):
+                raise HTTPError(400, f'cat must be one of {", ".join(CATEGORY_NAMES)} or null')
+            paths = record.get('paths')
+            if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+                raise HTTPError(400, 'paths must be a list of strings')
+        store, lock = self.user_store(username)
+        with lock:
+            for record in records:
+                store.assign(record['paths'], record.get('cat'))
+            store.flush()
+        return {'ok': True, 'records': len(records)}
+
+    def sale_search(self, params):
+        sort = params.get('sort') or None
+        if sort is not None and sort not in SORT_KEYS:
+            raise HTTPError(400, f'sort must be one of {", ".join(SORT_KEYS)}')
+        query = (params.get('name') or None, _float(params, 'min_price'), _float(params, 'max_price'),
+                 sort, params.get('desc') in ('1', 'true'))
+        offset = _int(params, 'offset', 0)
+        limit = min(_int(params, 'limit', MAX_PAGE), MAX_PAGE)
+        listings = self.acquire_listings()
+        try:
+            ids = self.search_ids(listings, query)
+            rows = []
+            for i in ids[offset:offset + limit]:
+                item = listings.items[i]
+                rows.append({'index': i, 'id': item['id'], 'name': item['name'], 'price': item.get('price'),
+                             'image': item.get('image', '')})
+        except StaleSourceError:
+            self.listings_changed(listings)
+        finally:
+            self.release_listings(listings)
+        return {'total': len(ids), 'offset': offset, 'items': rows}
+
+    def search_ids(self, listings, query):
+        # Clients page through a result, so the matched and sorted ids are kept
+        # for the last few queries instead of recomputed per page. The search
+        # itself runs outside the lock.
+        searches = listings.searches
+        with self.lock:
+            ids = searches.get(query)
+            if ids is not None:
+                searches.move_to_end(query)
+                return ids
+        ids = listings.index.search(*query[:3])
+        if query[3] is not None:
+            ids = sort_ids(listings.items, ids, query[3], query[4])
+        with self.lock:
+            searches[query] = ids
+            while len(searches) > SEARCH_CACHE:
+                searches.popitem(last=False)
+        return ids
+
+    def sale_item(self, index):
+        listings = self.acquire_listings()
+        try:
+            try:
+                item = listings.items[int(index)]
+            except (ValueError, IndexError):
+                raise HTTPError(404, 'no such sale item')
+            return {key: item[key] for key in item}
+        except StaleSourceError:
+            self.listings_changed(listings)
+        finally:
+            self.release_listings(listings)
+
+    def listings_changed(self, listings):
+        # Indexes handed out so far refer to the old listings: reload and
+        # have the client search again
+        self.load_sale_items(stale=listings)
+        raise HTTPError(409, 'sale items changed; search again')
+
+    async def thumbnail(self, params):
+        # Only catalog images are served; decoding runs off the event loop
+        path = params.get('path', '')
+        if self.catalog.record(path) is None:
+            raise HTTPError(404, 'not a catalog image')
+        width = _int(params, 'width', THUMB_SIZE[0])
+        height = _int(params, 'height', THUMB_SIZE[1])
+        if not (0 < width <= MAX_THUMB and 0 < height <= MAX_THUMB):
+            raise HTTPError(400, f'thumbnail sizes go up to {MAX_THUMB}')
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(self.executor, self._thumbnail_bytes, path, (width, height))
+        return ('image/png' if data.startswith(b'\x89PNG') else 'image/jpeg'), data
+
+    def _thumbnail_bytes(self, path, size):
+        key = thumbnail_key(path, size)
+        data = self.thumbs.lookup(key)
+        if data is None:
+            self.thumbs.get(path, size)
+            data = self.thumbs.lookup(key)
+        return data
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f'Catalog service on http://{host}:{port}/', file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    from main import BASE_DIR, YEAR_FOLDERS, IMAGE_EXTENSIONS, FIGURES_FILE, SALE_ITEMS_FILE
+
+    parser = argparse.ArgumentParser(description='Serve the catalog, categories and sale-item search on localhost.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--base-dir', default=BASE_DIR)
+    parser.add_argument('--figures', default=FIGURES_FILE)
+    parser.add_argument('--sale-items', default=SALE_ITEMS_FILE)
+    parser.add_argument('--users-dir', default=USERS_DIR)
+    args = parser.parse_args(argv)
+
+    service = CatalogService(args.base_dir, YEAR_FOLDERS, IMAGE_EXTENSIONS, args.figures, args.sale_items, args.users_dir)
+    service.load()
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+import json
+import os
+import time
+
+from instrument import count, timed
+from thumbnail_cache import try_lock
+
+# Per-user categories live in users/<name>/{want,have,dont_want}.json snapshots
+# plus an append-only journal of assignments made since the last compaction.
+USERS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'users')
+CATEGORY_NAMES = ('want', 'have', 'dont_want')
+JOURNAL_FILE = 'categories.journal'
+LOCK_FILE = 'categories.lock'
+LOCK_TIMEOUT = 10.0  # seconds to wait for another process's append or compaction
+FLUSH_DELAY_MS = 500
+COMPACT_EVERY = 2000  # journal records before folding them into the snapshots
+
+
+def user_dir_for(username, users_dir=USERS_DIR):
+    return os.path.join(users_dir, username)
+
+
+@timed('json_write')
+def write_json_atomic(file_path, data, **kwargs):
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, **kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+
+def read_snapshot(file_path):
+    # A missing snapshot is an empty category; one that does not parse is an
+    # error, since compaction would otherwise rewrite it from an empty set
+    try:
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return set()
+    except ValueError as e:
+        raise ValueError(f'{file_path} is not a valid category file: {e}') from e
+    if not isinstance(data, list):
+        raise ValueError(f'{file_path} is not a valid category file: expected a list')
+    return set(data)
+
+
+def read_journal(journal_path):
+    # Returns (records, torn); torn means a crash cut off a write. Records
+    # appended after a torn line (by another process) are still returned.
+    records = []
+    torn = False
+    try:
+        with open(journal_path, 'r') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    torn = True
+    except FileNotFoundError:
+        pass
+    return records, torn
+
+
+def apply_record(categories, record):
+    category = record.get('cat')
+    for path in record.get('paths', ()):
+        for cat in categories:
+            categories[cat].discard(path)
+        if category in categories:
+            categories[category].add(path)
+
+
+def _replay(user_dir):
+    categories = {cat: read_snapshot(os.path.join(user_dir, f'{cat}.json')) for cat in CATEGORY_NAMES}
+    records, torn = read_journal(os.path.join(user_dir, JOURNAL_FILE))
+    for record in records:
+        apply_record(categories, record)
+    return categories, len(records), torn
+
+
+def journal_lock(user_dir, timeout=LOCK_TIMEOUT):
+    # Short exclusive lock around each journal append and compaction, so a
+    # compaction never truncates records another process (the app, the
+    # catalog service, a second window) has just appended. Close to release.
+    os.makedirs(user_dir, exist_ok=True)
+    lock_path = os.path.join(user_dir, LOCK_FILE)
+    deadline = time.monotonic() + timeout
+    while True:
+        lock = try_lock(lock_path)
+        if lock is not None:
+            return lock
+        if time.monotonic() >= deadline:
+            raise OSError(f'timed out waiting for {lock_path}')
+        time.sleep(0.01)
+
+
+def read_categories(username, users_dir=USERS_DIR):
+    # Side-effect-free read of someone else's categories: snapshots plus the
+    # journal, skipping a torn line. Never compacts, so it is safe while the
+    # owner's app is appending.
+    return _replay(user_dir_for(username, users_dir))[0]
+
+
+class CategoryStore:
+    # Any process may append and compact: both happen under journal_lock, and
+    # compaction rebuilds the snapshots from the files rather than from
+    # memory. owner=False is for a process writing on the user's behalf (the
+    # catalog service) while the user's app may be open: its sets are also
+    # refreshed from the files when it compacts. The app keeps its own, since
+    # its views are built over them.
+    def __init__(self, username, users_dir=USERS_DIR, root=None, owner=True):
+        self.username = username
+        self.user_dir = user_dir_for(username, users_dir)
+        self.journal_path = os.path.join(self.user_dir, JOURNAL_FILE)
+        self.root = root  # Tk widget used to debounce flushes; None flushes immediately
+        self.categories = {cat: set() for cat in CATEGORY_NAMES}
+        self.pending = []
+        self.journal_records = 0
+        self.flush_id = None
+        self.owner = owner
+
+    def snapshot_path(self, category):
+        return os.path.join(self.user_dir, f'{category}.json')
+
+    def load(self):
+        self.categories, self.journal_records, torn = _replay(self.user_dir)
+        if torn:
+            # Fold the intact records into the snapshots so new appends don't
+            # land after the partial line
+            self.compact()
+        return self.categories
+
+    def assign(self, paths, category):
+        # category=None clears the paths from every category
+        record = {'cat': category, 'paths': list(paths)}
+        apply_record(self.categories, record)
+        self.pending.append(record)
+
+    def save(self):
+        if self.root is None:
+            self.flush()
+        elif self.flush_id is None:
+            self.flush_id = self.root.after(FLUSH_DELAY_MS, self.flush)
+
+    @timed('categories.flush')
+    def flush(self):
+        if self.flush_id is not None:
+            if self.root is not None:
+                self.root.after_cancel(self.flush_id)
+            self.flush_id = None
+        if not self.pending:
+            return
+        count('categories.records', len(self.pending))
+        data = ''.join(json.dumps(record) + '\n' for record in self.pending)
+        # One fsync covers every assignment made since the last flush
+        with journal_lock(self.user_dir), open(self.journal_path, 'a') as f:
+            if f.tell() and not self._ends_with_newline():
+                # Start on a fresh line after a torn write by a crashed process
+                data = '\n' + data
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_records += len(self.pending)
+        self.pending = []
+        if self.journal_records >= COMPACT_EVERY:
+            self.compact()
+
+    def _ends_with_newline(self):
+        with open(self.journal_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def compact(self):
+        # Rebuilt from the files so records other processes appended are
+        # kept; our own are already flushed. Snapshots are replaced one at a
+        # time and the journal is only truncated afterwards, so a crash in
+        # between is repaired by replaying it.
+        with journal_lock(self.user_dir):
+            categories = _replay(self.user_dir)[0]
+            for cat in CATEGORY_NAMES:
+                write_json_atomic(self.snapshot_path(cat), sorted(categories[cat]), indent=2)
+            with open(self.journal_path, 'w') as f:
+                f.flush()
+                os.fsync(f.fileno())
+        self.journal_records = 0
+        if not self.owner:
+            for cat in CATEGORY_NAMES:
+                self.categories[cat].clear()
+                self.categories[cat].update(categories[cat])
+
+    def close(self):
+        self.flush()
+        if self.journal_records:
+            self.compact()
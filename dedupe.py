@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from thumbnail_cache import CACHE_DIR
+
+HASH_CACHE_FILE = os.path.join(CACHE_DIR, 'phash_cache.json')
+DEFAULT_THRESHOLD = 6  # max differing bits between near-duplicates
+HASH_CHUNKSIZE = 32
+PAIR_BLOCK = 8192
+TABLE_BITS = 20
+
+
+def dhash(path):
+    # 64-bit difference hash of a 9x8 greyscale reduction
+    from PIL import Image
+    img = Image.open(path)
+    if img.format == 'JPEG':
+        img.draft('L', (64, 64))
+    pixels = np.asarray(img.convert('L').resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def _hash_worker(path):
+    try:
+        return path, dhash(path)
+    except Exception:
+        return path, None
+
+
+def load_hash_cache(cache_path=HASH_CACHE_FILE):
+    try:
+        with open(cache_path, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def save_hash_cache(cache, cache_path=HASH_CACHE_FILE):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, cache_path)
+
+
+def compute_hashes(paths, cache_path=HASH_CACHE_FILE, workers=None):
+    # path -> hash; only files whose mtime or size changed are decoded again
+    cache = load_hash_cache(cache_path)
+    hashes = {}
+    stale = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entry = cache.get(path)
+        stamp = [st.st_mtime_ns, st.st_size]
+        if entry and entry[:2] == stamp:
+            hashes[path] = entry[2]
+        else:
+            stale.append((path, stamp))
+    if stale:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(_hash_worker, [p for p, _ in stale], chunksize=HASH_CHUNKSIZE)
+            for (path, stamp), (_, value) in zip(stale, results):
+                if value is not None:
+                    hashes[path] = value
+                    cache[path] = stamp + [value]
+        live = set(paths)
+        cache = {p: v for p, v in cache.items() if p in live}
+        save_hash_cache(cache, cache_path)
+    return hashes
+
+
+def popcount64(values):
+    # Bit counts of a uint64 array, summed within the words (SWAR)
+    v = values - ((values >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    v = (v & np.uint64(0x3333333333333333)) + ((v >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    v = (v + (v >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (v * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def _chunk_bounds(threshold):
+    # threshold // 2 + 1 disjoint bit ranges: two hashes within `threshold`
+    # bits differ in at most one bit on at least one of them (multi-index
+    # hashing with one-bit probes)
+    parts = min(64, threshold // 2 + 1)
+    edges = np.linspace(0, 64, parts + 1).astype(int)
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def near_duplicate_pairs(hashes, threshold=DEFAULT_THRESHOLD, block=PAIR_BLOCK):
+    # (i, j, distance) for every pair within `threshold` bits, without
+    # comparing all pairs: candidates share a chunk up to one flipped bit
+    # and are verified a block of hashes at a time
+    values = np.asarray(hashes, dtype=np.uint64)
+    n = len(values)
+    found = []
+    for lo, hi in _chunk_bounds(threshold) if n > 1 else ():
+        mask = np.uint64((1 << (hi - lo)) - 1)
+        keys = (values >> np.uint64(lo)) & mask
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        probes = [np.uint64(0)] + [np.uint64(1 << bit) for bit in range(hi - lo)]
+        # Narrow chunks get a direct key -> bucket offset table
+        table = np.searchsorted(sorted_keys, np.arange((1 << (hi - lo)) + 1, dtype=np.uint64)) \
+            if hi - lo <= TABLE_BITS else None
+        for start in range(0, n, block):
+            idx = np.arange(start, min(start + block, n))
+            for probe in probes:
+                query = keys[idx] ^ probe
+                if table is not None:
+                    first = table[query]
+                    counts = table[query + np.uint64(1)] - first
+                else:
+                    first = np.searchsorted(sorted_keys, query, side='left')
+                    counts = np.searchsorted(sorted_keys, query, side='right') - first
+                total = int(counts.sum())
+                if not total:
+                    continue
+                a = np.repeat(idx, counts)
+                pos = np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(total)
+                b = order[pos]
+                keep = a < b
+                a, b = a[keep], b[keep]
+                distance = popcount64(values[a] ^ values[b]).astype(np.int64)
+                close = distance <= threshold
+                found.append(np.column_stack((a[close], b[close], distance[close])))
+    if not found:
+        return np.zeros((0, 3), dtype=np.int64)
+    # A pair close enough to match on several chunks is reported once
+    return np.unique(np.concatenate(found), axis=0)
+
+
+def duplicate_groups(paths, hashes, threshold=DEFAULT_THRESHOLD):
+    # Groups of near-duplicate paths, each in `paths` order so the first is
+    # the one to keep
+    paths = [p for p in paths if p in hashes]
+    pairs = near_duplicate_pairs([hashes[p] for p in paths], threshold)
+    parent = list(range(len(paths)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j, _ in pairs.tolist():
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    groups = {}
+    for i in range(len(paths)):
+        # Roots are the smallest index in their set, so they come first
+        groups.setdefault(find(i), []).append(paths[i])
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def hidden_duplicates(groups):
+    return {path for group in groups for path in group[1:]}
+
+
+def main(argv=None):
+    from main import BASE_DIR, YEAR_FOLDERS, IMAGE_EXTENSIONS
+    from catalog_scan import scan_catalog
+
+    parser = argparse.ArgumentParser(description='Report duplicate and near-duplicate scans in the catalog.')
+    parser.add_argument('--base-dir', default=BASE_DIR)
+    parser.add_argument('--threshold', type=int, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--json', action='store_true', help='print groups as JSON')
+    args = parser.parse_args(argv)
+
+    paths = scan_catalog(args.base_dir, YEAR_FOLDERS, IMAGE_EXTENSIONS)
+    groups = duplicate_groups(paths, compute_hashes(paths, workers=args.workers), args.threshold)
+    if args.json:
+        print(json.dumps(groups, indent=2))
+        return
+    for group in groups:
+        print(f'keep {group[0]}')
+        for path in group[1:]:
+            print(f'  duplicate {path}')
+    print(f'{len(groups)} groups, {sum(len(g) - 1 for g in groups)} duplicates')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import numpy as np
+
+from catalog_index import CATEGORY_CODES, UNCATEGORIZED
+
+CATEGORY_FACETS = dict(CATEGORY_CODES, none=UNCATEGORIZED)
+
+
+def _words(n):
+    return np.zeros((n + 63) // 64, dtype=np.uint64)
+
+
+def _pack(mask):
+    # bool array -> little-endian packed uint64 words
+    n = len(mask)
+    padded = np.zeros(((n + 63) // 64) * 64, dtype=bool)
+    padded[:n] = mask
+    return np.packbits(padded, bitorder='little').view(np.uint64)
+
+
+def _unpack(words, n):
+    return np.unpackbits(words.view(np.uint8), bitorder='little', count=n).astype(bool)
+
+
+class FacetIndex:
+    # Packed bitsets over catalog records for year, weapon, vehicle and category
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.n = n = len(catalog.records)
+        self._order = None
+        self.all = _pack(np.ones(n, dtype=bool))
+        years, weapons, vehicles, categories = {}, {}, {}, {}
+        has_vehicle = np.zeros(n, dtype=bool)
+        for i, rec in enumerate(catalog.records):
+            meta = rec.meta or {}
+            years.setdefault(str(rec.year), []).append(i)
+            for weapon in meta.get('weapons') or ():
+                weapons.setdefault(str(weapon).lower(), []).append(i)
+            vehicle = meta.get('vehicle')
+            if vehicle:
+                has_vehicle[i] = True
+                vehicles.setdefault(str(vehicle).lower(), []).append(i)
+            categories.setdefault(rec.category, []).append(i)
+        self.years = {k: self._bitmap(v) for k, v in years.items()}
+        self.weapons = {k: self._bitmap(v) for k, v in weapons.items()}
+        self.vehicles = {k: self._bitmap(v) for k, v in vehicles.items()}
+        self.has_vehicle = _pack(has_vehicle)
+        self.categories = {code: self._bitmap(categories.get(code, ())) for code in CATEGORY_FACETS.values()}
+
+    def _bitmap(self, positions):
+        mask = np.zeros(self.n, dtype=bool)
+        mask[np.fromiter(positions, dtype=np.int64)] = True
+        return _pack(mask)
+
+    def _any(self, table, values):
+        out = _words(self.n)
+        for value in values:
+            bits = table.get(value)
+            if bits is not None:
+                out |= bits
+        return out
+
+    def set_category(self, rec_index, category):
+        # Move one record between category bitmaps without a rebuild
+        code = CATEGORY_FACETS.get(category, UNCATEGORIZED)
+        word, bit = divmod(rec_index, 64)
+        mask = np.uint64(1) << np.uint64(bit)
+        for bits in self.categories.values():
+            bits[word] &= ~mask
+        self.categories[code][word] |= mask
+
+    def query(self, years=None, weapons=None, vehicle=None, categories=None, exclude_categories=None):
+        # Values within one facet are OR'd, facets are AND'd.
+        # vehicle: True/False for with/without any vehicle, or a vehicle name.
+        result = self.all.copy()
+        if years:
+            result &= self._any(self.years, [str(y) for y in years])
+        if weapons:
+            result &= self._any(self.weapons, [w.lower() for w in weapons])
+        if vehicle is True:
+            result &= self.has_vehicle
+        elif vehicle is False:
+            result &= ~self.has_vehicle
+        elif vehicle:
+            result &= self._any(self.vehicles, [vehicle.lower()])
+        if categories:
+            result &= self._any(self.categories, [CATEGORY_FACETS[c] for c in categories])
+        if exclude_categories:
+            result &= ~self._any(self.categories, [CATEGORY_FACETS[c] for c in exclude_categories])
+        return _unpack(result, self.n)
+
+    def filter_paths(self, keys=None, **query):
+        # Matching paths in the catalog order for sort keys (None = load order)
+        mask = self.query(**query)
+        if keys is None:
+            positions = np.flatnonzero(mask)
+        else:
+            perm = self.catalog.permutation(keys)
+            if self._order is None or self._order[0] is not perm:
+                self._order = (perm, np.asarray(perm, dtype=np.int64))
+            order = self._order[1]
+            positions = order[mask[order]]
+        records = self.catalog.records
+        return [records[i].path for i in positions.tolist()]
+
+    def values(self):
+        return {
+            'years': sorted(self.years),
+            'weapons': sorted(self.weapons),
+            'vehicles': sorted(self.vehicles),
+        }
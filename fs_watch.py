@@ -0,0 +1,192 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+
+from catalog_scan import list_folder
+
+WATCH_POLL_MS = 500
+# A burst of changes (a folder of scans being copied in) is applied once the
+# watched paths have been quiet this long
+SETTLE_MS = 700
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+DIR_EVENTS = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+PARENT_EVENTS = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ATTRIB
+_EVENT = struct.Struct('iIII')
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class PollingWatcher:
+    # Portable fallback: a watched directory is reported when its mtime
+    # changes (an entry was added, removed or renamed), a file when its mtime
+    # or size changes or it appears or disappears
+    def __init__(self):
+        self.stamps = {}
+
+    def add(self, path):
+        self.stamps[path] = _stamp(path)
+
+    def poll(self):
+        changed = set()
+        for path, old in self.stamps.items():
+            new = _stamp(path)
+            if new != old:
+                self.stamps[path] = new
+                changed.add(path)
+        return changed
+
+    def close(self):
+        self.stamps.clear()
+
+
+class InotifyWatcher:
+    # Linux inotify through ctypes, no external services. Each path is also
+    # watched through its parent directory so a folder created later or a
+    # file replaced with os.replace is still noticed.
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is only available on Linux')
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.paths = set()
+        self.dir_watches = {}  # wd -> watched directory path
+        self.parent_watches = {}  # wd -> (parent dir, {entry name: watched path})
+
+    def _watch(self, path, mask):
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        return wd if wd >= 0 else None
+
+    def add(self, path):
+        self.paths.add(path)
+        parent, name = os.path.split(os.path.abspath(path))
+        wd = self._watch(parent, PARENT_EVENTS)
+        if wd is not None:
+            names = self.parent_watches.setdefault(wd, (parent, {}))[1]
+            names[name] = path
+        if os.path.isdir(path):
+            self._watch_dir(path)
+
+    def _watch_dir(self, path):
+        wd = self._watch(path, DIR_EVENTS)
+        if wd is not None:
+            self.dir_watches[wd] = path
+
+    def poll(self):
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            pos = 0
+            while pos < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, pos)
+                name = data[pos + _EVENT.size:pos + _EVENT.size + length].rstrip(b'\0')
+                pos += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped: everything may have changed
+                    changed.update(self.paths)
+                    continue
+                if wd in self.dir_watches:
+                    path = self.dir_watches[wd]
+                    changed.add(path)
+                    if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                        del self.dir_watches[wd]
+                elif wd in self.parent_watches:
+                    path = self.parent_watches[wd][1].get(os.fsdecode(name))
+                    if path is None:
+                        continue
+                    changed.add(path)
+                    if mask & (IN_CREATE | IN_MOVED_TO) and os.path.isdir(path) \
+                            and path not in self.dir_watches.values():
+                        self._watch_dir(path)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def make_watcher(paths):
+    try:
+        watcher = InotifyWatcher()
+    except (OSError, AttributeError):
+        watcher = PollingWatcher()
+    for path in paths:
+        watcher.add(path)
+    return watcher
+
+
+class TkWatch:
+    # Polls a watcher from the Tk event loop and hands the set of changed
+    # paths to callback on the Tk thread once they have settled
+    def __init__(self, root, paths, callback, interval=WATCH_POLL_MS, settle=SETTLE_MS):
+        self.root = root
+        self.callback = callback
+        self.interval = interval
+        self.settle = settle
+        self.watcher = make_watcher(paths)
+        self.changed = set()
+        self.quiet_ms = 0
+        self.after_id = self.root.after(self.interval, self._poll)
+
+    def _poll(self):
+        changed = self.watcher.poll()
+        if changed:
+            self.changed |= changed
+            self.quiet_ms = 0
+        elif self.changed:
+            self.quiet_ms += self.interval
+            if self.quiet_ms >= self.settle:
+                changed, self.changed = self.changed, set()
+                self.callback(changed)
+        self.after_id = self.root.after(self.interval, self._poll)
+
+    def stop(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+        self.watcher.close()
+
+
+def diff_folder(folder, known, extensions):
+    # (added, removed) image paths of one folder against the paths we hold
+    try:
+        names = list_folder(folder, extensions)
+    except OSError:
+        names = []
+    current = {os.path.join(folder, name) for name in names}
+    return sorted(current - known), sorted(known - current)
+
+
+def diff_mapping(old, new):
+    # Keys added or changed in `new`, and keys gone from it
+    changed = {key for key, value in new.items() if old.get(key) != value}
+    return changed, set(old) - set(new)
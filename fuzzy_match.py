@@ -0,0 +1,141 @@
+import math
+import re
+
+import numpy as np
+
+# Trigrams shared by more than this fraction of figures say little about which
+# figure a listing means and would blow up the candidate lists
+MAX_DF_RATIO = 0.05
+MATCH_BATCH = 4096
+TOP_K = 3
+MIN_SCORE = 0.6
+YEAR_RE = re.compile(r'\b(19[89]\d)\b')
+_NON_WORD = re.compile(r'[^0-9a-z]+')
+
+
+def name_trigrams(text):
+    grams = set()
+    for word in _NON_WORD.sub(' ', str(text).lower()).split():
+        padded = f' {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def listing_year(text):
+    match = YEAR_RE.search(str(text))
+    return int(match.group(1)) if match else 0
+
+
+def _year(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class FuzzyMatcher:
+    # Links free-text listing names to catalog figures. Figures are IDF-weighted
+    # trigram vectors stored as an inverted index; a listing's score for a figure
+    # is their cosine similarity, i.e. the geometric mean of the share of the
+    # figure's weight found in the listing and the share of the listing's
+    # weight found in the figure. Listing trigrams no figure uses say nothing
+    # about which figure is meant and are left out, so "MOC" or "loose" do
+    # not lower the score, but "Cobra" no longer matches "Cobra Commander" as
+    # well as "Cobra Commander" does.
+    def __init__(self, keys, names, years=None):
+        self.keys = list(keys)
+        n = len(self.keys)
+        self.years = np.array([_year(y) for y in (years or [0] * n)], dtype=np.int32)
+        self.vocab = {}
+        fig_grams = []
+        for name in names:
+            ids = []
+            for gram in name_trigrams(name):
+                ids.append(self.vocab.setdefault(gram, len(self.vocab)))
+            fig_grams.append(ids)
+        rows = np.fromiter((i for i, ids in enumerate(fig_grams) for _ in ids), dtype=np.int64)
+        cols = np.fromiter((g for ids in fig_grams for g in ids), dtype=np.int64)
+        df = np.bincount(cols, minlength=len(self.vocab)) if len(cols) else np.zeros(len(self.vocab), dtype=np.int64)
+        idf = np.log((n + 1) / (df + 1)) + 1.0
+        # Squared IDF per trigram, zero for the ones too common to keep
+        self.gram_weight = np.where(df <= max(2, math.ceil(MAX_DF_RATIO * n)), idf ** 2, 0.0)
+        keep = self.gram_weight[cols] > 0
+        rows, cols = rows[keep], cols[keep]
+        weight = self.gram_weight[cols]
+        # Postings carry weight / |figure|; dividing by |listing| gives the cosine
+        norms = np.sqrt(np.bincount(rows, weights=weight, minlength=n))
+        data = weight / np.where(norms[rows] > 0, norms[rows], 1.0)
+        order = np.argsort(cols, kind='stable')
+        self.fig_index = rows[order]
+        self.fig_weight = data[order]
+        self.indptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cols, minlength=len(self.vocab)), out=self.indptr[1:])
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        records = [rec for rec in catalog.records if rec.name]
+        return cls([rec.rel_path for rec in records], [rec.name for rec in records], [rec.year for rec in records])
+
+    def match(self, names, top_k=TOP_K, min_score=MIN_SCORE, batch=MATCH_BATCH):
+        # Returns (listing indices, figure indices, scores), best first per listing
+        out_l, out_f, out_s = [], [], []
+        for start in range(0, len(names), batch):
+            chunk = names[start:start + batch]
+            result = self._match_batch(chunk, start, top_k, min_score)
+            if result is not None:
+                out_l.append(result[0])
+                out_f.append(result[1])
+                out_s.append(result[2])
+        if not out_l:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0)
+        return np.concatenate(out_l), np.concatenate(out_f), np.concatenate(out_s)
+
+    def _match_batch(self, names, offset, top_k, min_score):
+        vocab = self.vocab
+        listing_ids, gram_ids, years = [], [], []
+        for i, name in enumerate(names):
+            years.append(listing_year(name))
+            for gram in name_trigrams(name):
+                gid = vocab.get(gram)
+                if gid is not None:
+                    listing_ids.append(i)
+                    gram_ids.append(gid)
+        if not gram_ids:
+            return None
+        lst = np.array(listing_ids, dtype=np.int64)
+        grams = np.array(gram_ids, dtype=np.int64)
+        starts = self.indptr[grams]
+        lens = self.indptr[grams + 1] - starts
+        total = int(lens.sum())
+        if not total:
+            return None
+        # Expand every (listing, trigram) pair into its figure postings at once
+        rep_l = np.repeat(lst, lens)
+        first = np.repeat(starts - np.cumsum(lens) + lens, lens)
+        pos = first + np.arange(total)
+        figs = self.fig_index[pos]
+        contrib = self.fig_weight[pos]
+        # Blocking: a listing that names a year only scores figures from that year
+        lyears = np.array(years, dtype=np.int32)[rep_l]
+        fyears = self.years[figs]
+        keep = (lyears == 0) | (fyears == 0) | (lyears == fyears)
+        rep_l, figs, contrib = rep_l[keep], figs[keep], contrib[keep]
+        n_figs = len(self.keys)
+        pair, inverse = np.unique(rep_l * n_figs + figs, return_inverse=True)
+        scores = np.bincount(inverse, weights=contrib)
+        pair_l, pair_f = pair // n_figs, pair % n_figs
+        listing_norms = np.sqrt(np.bincount(lst, weights=self.gram_weight[grams], minlength=len(names)))
+        scores /= np.where(listing_norms[pair_l] > 0, listing_norms[pair_l], 1.0)
+        good = scores >= min_score
+        pair_l, pair_f, scores = pair_l[good], pair_f[good], scores[good]
+        order = np.lexsort((-scores, pair_l))
+        pair_l, pair_f, scores = pair_l[order], pair_f[order], scores[order]
+        group_start = np.searchsorted(pair_l, pair_l, side='left')
+        top = np.arange(len(pair_l)) - group_start < top_k
+        return pair_l[top] + offset, pair_f[top], scores[top]
+
+    def best_matches(self, names, min_score=MIN_SCORE):
+        # listing index -> (figure key, score) for the top candidate only
+        lst, figs, scores = self.match(names, top_k=1, min_score=min_score)
+        return {int(l): (self.keys[int(f)], float(s)) for l, f, s in zip(lst, figs, scores)}
@@ -0,0 +1,118 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from thumbnail_cache import THUMB_SIZE, get_cache
+
+PREFETCH_RADIUS = 3
+PREFETCH_WORKERS = min(4, os.cpu_count() or 1)
+POLL_MS = 15
+
+
+def window_order(index, count, radius):
+    # Current image first, then alternating forward/backward neighbours
+    order = [index % count]
+    for off in range(1, radius + 1):
+        order.append((index + off) % count)
+        order.append((index - off) % count)
+    seen = set()
+    return [i for i in order if not (i in seen or seen.add(i))]
+
+
+class ImagePrefetcher:
+    def __init__(self, root, radius=PREFETCH_RADIUS, workers=PREFETCH_WORKERS, capacity=None, size=THUMB_SIZE,
+                 loader=None):
+        self.root = root
+        self.radius = radius
+        self.size = size
+        self.loader = loader  # (path, size) -> PIL image; defaults to the local thumbnail cache
+        self.capacity = capacity or max(16, 4 * radius + 2)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+        self.lock = threading.RLock()
+        self.ready = OrderedDict()  # path -> decoded PIL image, LRU order
+        self.errors = {}  # path -> exception from the worker
+        self.pending = {}  # path -> Future
+        self.waiting = {}  # path -> callback to run on the Tk thread
+        self.poll_id = None
+
+    def _decode(self, path):
+        if self.loader is not None:
+            return self.loader(path, self.size)
+        return get_cache().get(path, self.size)
+
+    def _done(self, path, future):
+        # Runs on the worker thread; the Tk thread picks results up in _poll
+        if future.cancelled():
+            return
+        with self.lock:
+            self.pending.pop(path, None)
+            exc = future.exception()
+            if exc is not None:
+                self.errors[path] = exc
+                return
+            self.ready[path] = future.result()
+            self.ready.move_to_end(path)
+            while len(self.ready) > self.capacity:
+                self.ready.popitem(last=False)
+
+    def get(self, path):
+        with self.lock:
+            img = self.ready.get(path)
+            if img is not None:
+                self.ready.move_to_end(path)
+            return img
+
+    def request(self, paths, index):
+        if not paths:
+            return
+        self.fetch([paths[i] for i in window_order(index, len(paths), self.radius)])
+
+    def fetch(self, wanted):
+        # Decode `wanted` in order, cancelling queued work for anything else
+        wanted_set = set(wanted)
+        with self.lock:
+            for path, future in list(self.pending.items()):
+                if path not in wanted_set and future.cancel():
+                    del self.pending[path]
+            for path in wanted:
+                if path not in self.ready and path not in self.pending:
+                    self._submit(path)
+
+    def failed(self, path):
+        with self.lock:
+            return path in self.errors
+
+    def _submit(self, path):
+        # Caller holds self.lock
+        self.errors.pop(path, None)
+        future = self.executor.submit(self._decode, path)
+        self.pending[path] = future
+        future.add_done_callback(lambda f, p=path: self._done(p, f))
+
+    def when_ready(self, path, callback):
+        # Only the latest request matters: drop callbacks for images we moved past
+        self.waiting = {path: callback}
+        if self.poll_id is None:
+            self.poll_id = self.root.after(POLL_MS, self._poll)
+
+    def _poll(self):
+        self.poll_id = None
+        for path, callback in list(self.waiting.items()):
+            with self.lock:
+                img = self.ready.get(path)
+                exc = self.errors.get(path)
+                if img is None and exc is None and path not in self.pending:
+                    self._submit(path)
+            if img is not None or exc is not None:
+                del self.waiting[path]
+                callback(path, img)
+        if self.waiting:
+            self.poll_id = self.root.after(POLL_MS, self._poll)
+
+    def shutdown(self):
+        if self.poll_id is not None:
+            self.root.after_cancel(self.poll_id)
+            self.poll_id = None
+        self.waiting.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
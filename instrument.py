@@ -0,0 +1,191 @@
+import atexit
+import cProfile
+import math
+import os
+import pstats
+import threading
+import time
+from functools import wraps
+
+# GIJOE_STATS=1 turns on the timers and counters. When it is off, `timed`
+# returns the function untouched and `timer`/`count` do nothing, so the
+# instrumented code pays nothing beyond a global lookup.
+ENABLED = os.environ.get('GIJOE_STATS', '') not in ('', '0')
+# GIJOE_PROFILE=<file> profiles the whole session and writes pstats on exit
+PROFILE_PATH = os.environ.get('GIJOE_PROFILE') or None
+# Histogram buckets per doubling of duration; 4 keeps percentiles within ~19%
+BUCKETS_PER_OCTAVE = 4
+MIN_SECONDS = 1e-6
+
+
+class Histogram:
+    # Log-bucketed durations: constant memory however many samples arrive
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.buckets = {}
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        bucket = int(math.log2(max(seconds, MIN_SECONDS) / MIN_SECONDS) * BUCKETS_PER_OCTAVE)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, p):
+        # Upper edge of the bucket holding the p-th percentile, capped at max
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self.max, MIN_SECONDS * 2 ** ((bucket + 1) / BUCKETS_PER_OCTAVE))
+        return self.max
+
+
+_lock = threading.Lock()
+_timers = {}
+_counters = {}
+_profiler = None
+
+
+def record(name, seconds):
+    with _lock:
+        hist = _timers.get(name)
+        if hist is None:
+            hist = _timers[name] = Histogram()
+        hist.add(seconds)
+
+
+def _count(name, n=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def _no_count(name, n=1):
+    pass
+
+
+count = _count if ENABLED else _no_count
+
+
+def timed(name):
+    # Decorator timing every call under `name`; identity when stats are off
+    def decorate(func):
+        if not ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+class _Timer:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name):
+    # `with timer('name'):` around a block; a shared no-op when stats are off
+    return _Timer(name) if ENABLED else _NULL_TIMER
+
+
+def snapshot():
+    # name -> summary dict for timers (seconds) and counters
+    with _lock:
+        timers = {name: {
+            'count': h.count,
+            'total_s': h.total,
+            'mean_s': h.total / h.count if h.count else 0.0,
+            'min_s': h.min if h.count else 0.0,
+            'p50_s': h.percentile(50),
+            'p90_s': h.percentile(90),
+            'p99_s': h.percentile(99),
+            'max_s': h.max,
+        } for name, h in _timers.items()}
+        counters = dict(_counters)
+    return {'timers': timers, 'counters': counters}
+
+
+def reset():
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+def format_stats(stats=None):
+    stats = stats or snapshot()
+    if not ENABLED:
+        return 'Instrumentation is off. Start with GIJOE_STATS=1 to collect timings.'
+    lines = [f"{'timer':28s} {'n':>7s} {'mean':>9s} {'p50':>9s} {'p90':>9s} {'p99':>9s} {'max':>9s}  (ms)"]
+    for name, row in sorted(stats['timers'].items(), key=lambda kv: -kv[1]['total_s']):
+        lines.append(f"{name:28s} {row['count']:7d} " + ' '.join(
+            f"{row[key] * 1000:9.2f}" for key in ('mean_s', 'p50_s', 'p90_s', 'p99_s', 'max_s')))
+    if stats['counters']:
+        lines.append('')
+        lines.extend(f'{name:28s} {value:7d}' for name, value in sorted(stats['counters'].items()))
+    return '\n'.join(lines)
+
+
+def profiling():
+    return _profiler is not None
+
+
+def start_profile():
+    global _profiler
+    if _profiler is None:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def stop_profile(path=None):
+    # Stops the running profile; writes pstats to `path` if given and
+    # returns the pstats.Stats for it
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is None:
+        return None
+    profiler.disable()
+    if path:
+        profiler.dump_stats(path)
+    return pstats.Stats(profiler)
+
+
+if PROFILE_PATH:
+    start_profile()
+    atexit.register(stop_profile, PROFILE_PATH)
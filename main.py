@@ -1,8 +1,19 @@
 import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox
-from PIL import Image, ImageTk
 import json
+from thumbnail_cache import get_cache
+from image_prefetch import ImagePrefetcher, PREFETCH_RADIUS
+from catalog_scan import iter_catalog, scan_catalog
+from category_store import CategoryStore
+from ordered_view import CategoryViews
+from catalog_index import CatalogIndex
+from virtual_list import VirtualList
+from thumbnail_grid import GRID_CACHE_SIZE, GRID_THUMB_SIZE, ThumbnailGrid
+from sale_store import load_sale_store
+from instrument import count, timed, timer
 
 # Directories for images
 BASE_DIR = r'C:\GI JOE Trader'
@@ -13,22 +24,85 @@ IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp')
 WANT_FILE = 'want.json'
 HAVE_FILE = 'have.json'
 DONT_WANT_FILE = 'dont_want.json'
+SALE_ITEMS_FILE = 'sale_items.json'
+FIGURES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'figures.json')
+
+# Streaming startup: poll interval for background loaders and the deadline for
+# putting something on screen
+STARTUP_POLL_MS = 50
+FIRST_PAINT_BUDGET_MS = 200
+# Poll interval for one-off searches run on a worker thread
+BACKGROUND_POLL_MS = 50
+
+
+def run_in_background(widget, work, done):
+    # Runs work() on a worker thread and calls done(result, error) back on
+    # the Tk thread, so long searches don't freeze the window
+    results = queue.Queue(maxsize=1)
+
+    def worker():
+        try:
+            results.put((work(), None))
+        except Exception as e:
+            results.put((None, e))
+
+    def poll():
+        try:
+            result, error = results.get_nowait()
+        except queue.Empty:
+            widget.after(BACKGROUND_POLL_MS, poll)
+            return
+        if widget.winfo_exists():
+            done(result, error)
+
+    threading.Thread(target=worker, daemon=True).start()
+    widget.after(BACKGROUND_POLL_MS, poll)
+
 
 class GIJoeApp:
-    def __init__(self, root, username):
+    def __init__(self, root, username, prefetch_radius=PREFETCH_RADIUS, streaming=True, client=None):
         self.root = root
         self.username = username
+        # With a catalog_service client the catalog, figures.json, categories
+        # and thumbnails all come from the service instead of the disk
+        self.client = client
+        self.prefetcher = ImagePrefetcher(self.root, radius=prefetch_radius,
+                                          loader=client.thumbnail if client else None)
         self.root.title(f'GI JOE Collectables Viewer - {self.username}')
         self.root.geometry('600x700')
 
-        self.image_paths = self.load_all_images()
+        self.streaming = streaming
         self.current_index = 0
         self.want_mode = False  # Track if we're in want-list mode
         self.want_image_paths = []
         self.want_index = 0
         self.categories = {'want': set(), 'have': set(), 'dont_want': set()}
-        self.load_categories()
+        self.category_store = None
+        self.trade_matcher = None
+        self.trades_running = False
         self.current_sort = None  # Track current sort mode
+        self.sort_keys = None
+        self.catalog = CatalogIndex(client.info['base_dir'] if client else BASE_DIR)
+        # Faceted filter: built on first use, dropped when the catalog changes
+        self.facet_index = None
+        self.facet_query = None
+        self.facet_paths = None
+        self.facet_pos = 0
+        # Near-duplicate scans: groups found on first use, later copies hidden on request
+        self.duplicate_groups = None
+        self.hidden_paths = set()
+        self.watch = None
+        if streaming:
+            # Catalog, categories and figures.json arrive from background threads
+            self.image_paths = []
+            self.refresh_want_list()
+            self.figure_meta = {}
+            self.catalog_loaded = self.categories_loaded = self.meta_loaded = False
+        else:
+            self.image_paths = self.load_all_images()
+            self.catalog.add(self.image_paths)
+            self.load_categories()
+            self.catalog_loaded = self.categories_loaded = self.meta_loaded = True
 
         # Toggle button for want-list mode
         self.toggle_frame = tk.Frame(self.root)
@@ -45,10 +119,15 @@ class GIJoeApp:
         self.sort_name_btn.pack(side=tk.LEFT, padx=5)
         self.sort_category_btn = tk.Button(self.sort_frame, text='Sort by Category', command=self.sort_by_category, bg='#e0e0e0')
         self.sort_category_btn.pack(side=tk.LEFT, padx=5)
+        self.sort_year_name_btn = tk.Button(self.sort_frame, text='Sort by Year + Name', command=self.sort_by_year_name, bg='#e0e0e0')
+        self.sort_year_name_btn.pack(side=tk.LEFT, padx=5)
 
         # Shop button
         self.shop_btn = tk.Button(self.toggle_frame, text='Open Shop', command=self.open_shop_window, bg='#ffc107')
         self.shop_btn.pack(side=tk.TOP, pady=2)
+        self.grid_btn = tk.Button(self.toggle_frame, text='Grid View', command=self.open_grid_view, bg='#e0e0e0')
+        self.grid_btn.pack(side=tk.TOP, pady=2)
+        self.grid_window = None
 
         self.image_label = tk.Label(self.root)
         self.image_label.pack(expand=True, fill=tk.BOTH)
@@ -58,7 +137,9 @@ class GIJoeApp:
         self.meta_label.pack(side=tk.TOP, pady=5)
 
         # Load figure metadata
-        self.figure_meta = self.load_figure_metadata()
+        if not streaming:
+            self.figure_meta = self.load_figure_metadata()
+            self.catalog.set_metadata(self.figure_meta)
 
         btn_frame = tk.Frame(self.root)
         btn_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=10)
@@ -83,39 +164,201 @@ class GIJoeApp:
         compare_menu = tk.Menu(menu, tearoff=0)
         menu.add_cascade(label='Compare', menu=compare_menu)
         compare_menu.add_command(label='Compare with Seller List', command=self.compare_with_seller)
+        compare_menu.add_command(label='Rank Seller Lists in Folder...', command=self.compare_with_seller_folder)
+        compare_menu.add_command(label='Find Trades with Other Users', command=self.find_trades)
+        filter_menu = tk.Menu(menu, tearoff=0)
+        menu.add_cascade(label='Filter', menu=filter_menu)
+        filter_menu.add_command(label='Faceted Filter...', command=self.open_facet_filter)
+        filter_menu.add_command(label='Clear Filter', command=self.clear_facet_filter)
+        filter_menu.add_separator()
+        self.hide_duplicates_var = tk.BooleanVar(value=False)
+        filter_menu.add_checkbutton(label='Hide Duplicates', variable=self.hide_duplicates_var, command=self.toggle_hide_duplicates)
+        filter_menu.add_command(label='Duplicate Report...', command=self.show_duplicate_report)
+        tools_menu = tk.Menu(menu, tearoff=0)
+        menu.add_cascade(label='Tools', menu=tools_menu)
+        tools_menu.add_command(label='Performance Stats...', command=self.open_stats_window)
 
-        self.display_image()
+        self.root.protocol('WM_DELETE_WINDOW', self.on_close)
+        if streaming:
+            self.start_background_load()
+        else:
+            self.display_image()
+            self.start_watcher()
+
+    def start_background_load(self):
+        self.load_queue = queue.Queue()
+        self.image_shown = False
+        threading.Thread(target=self._scan_worker, daemon=True).start()
+        threading.Thread(target=self._metadata_worker, daemon=True).start()
+        self.update_nav_controls()
+        self.root.after(FIRST_PAINT_BUDGET_MS, self._first_paint_deadline)
+        self.root.after(STARTUP_POLL_MS, self._drain_load_queue)
+
+    def _scan_worker(self):
+        try:
+            with timer('load.scan'):
+                if self.client is not None:
+                    self.load_queue.put(('images', self.client.catalog_paths()))
+                    return
+                for _, paths in iter_catalog(BASE_DIR, YEAR_FOLDERS, IMAGE_EXTENSIONS):
+                    count('load.images', len(paths))
+                    self.load_queue.put(('images', paths))
+        except Exception as e:
+            self.load_queue.put(('error', f'Failed to load the catalog: {e}'))
+        finally:
+            self.load_queue.put(('images_done', None))
+
+    def _metadata_worker(self):
+        # Each loader always posts its message, None/{} on failure, so the
+        # startup poll finishes and the error reaches the user
+        store = None
+        try:
+            store = self.read_categories()
+        except Exception as e:
+            self.load_queue.put(('error', f'Failed to load your categories: {e}'))
+        finally:
+            self.load_queue.put(('categories', store))
+        figure_meta = {}
+        try:
+            figure_meta = self.load_figure_metadata()
+        except Exception as e:
+            self.load_queue.put(('error', f'Failed to load figure metadata: {e}'))
+        finally:
+            self.load_queue.put(('figure_meta', figure_meta))
+
+    def _first_paint_deadline(self):
+        # Nothing scanned yet: paint the loading state instead of a blank window
+        if not self.image_shown:
+            self.display_image()
+
+    @timed('load.drain')
+    def _drain_load_queue(self):
+        images_changed = categories_changed = meta_changed = False
+        errors = []
+        while True:
+            try:
+                kind, payload = self.load_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'images':
+                self.catalog.add(payload)
+                self.facet_index = None
+                self.category_views.extend(payload)
+                images_changed = True
+            elif kind == 'images_done':
+                self.catalog_loaded = True
+            elif kind == 'categories':
+                # Without a store (read failed) categorizing stays disabled
+                # rather than overwriting files we could not read
+                if payload is not None:
+                    self.category_store = payload
+                    self.categories = payload.categories
+                    self.catalog.set_categories(self.categories)
+                self.categories_loaded = categories_changed = True
+            elif kind == 'figure_meta':
+                self.figure_meta = payload
+                self.catalog.set_metadata(payload)
+                self.facet_index = None
+                self.meta_loaded = meta_changed = True
+            elif kind == 'error':
+                errors.append(payload)
+        if errors:
+            messagebox.showerror('Load Error', '\n'.join(errors))
+        if categories_changed:
+            self.refresh_want_list()
+        if not self.image_shown and self.get_active_image_list():
+            self.image_shown = True
+            self.display_image()
+        elif self.image_shown and meta_changed:
+            self.display_image()
+        self.update_nav_controls()
+        if not (self.catalog_loaded and self.categories_loaded and self.meta_loaded):
+            self.root.after(STARTUP_POLL_MS, self._drain_load_queue)
+        else:
+            self.start_watcher()
+
+    def update_nav_controls(self):
+        has_images = bool(self.get_active_image_list())
+        nav_state = tk.NORMAL if has_images else tk.DISABLED
+        self.prev_btn.config(state=nav_state)
+        self.next_btn.config(state=nav_state)
+        # Categorizing before the category files are read would overwrite them
+        cat_state = tk.NORMAL if has_images and self.category_store is not None else tk.DISABLED
+        for btn in (self.want_btn, self.have_btn, self.dont_want_btn):
+            btn.config(state=cat_state)
+        self.want_toggle_btn.config(state=tk.NORMAL if self.categories_loaded else tk.DISABLED)
+        sort_state = tk.NORMAL if self.catalog_loaded and self.meta_loaded else tk.DISABLED
+        for btn in (self.sort_year_btn, self.sort_name_btn, self.sort_category_btn, self.sort_year_name_btn):
+            btn.config(state=sort_state)
+        self.update_title()
+
+    def update_title(self):
+        if not self.get_active_image_list():
+            title = 'GI JOE Collectables Viewer'
+        else:
+            if self.facet_paths is not None:
+                mode = 'FILTER'
+            else:
+                mode = 'WANT LIST' if self.want_mode else 'ALL'
+            title = f'GI JOE Collectables Viewer - {self.username} [{mode}]'
+        if not self.catalog_loaded:
+            title += f' (loading... {len(self.image_paths)} images)'
+        self.root.title(title)
+
+    def on_close(self):
+        if self.watch is not None:
+            self.watch.stop()
+        self.prefetcher.shutdown()
+        if self.category_store is not None:
+            self.category_store.close()
+        if self.client is not None:
+            self.client.close()
+        else:
+            get_cache().close()
+        self.root.destroy()
 
     def open_shop_window(self):
-        ShopWindow(self.root, self.username)
+        ShopWindow(self.root, self.username, app=self)
+
+    def open_stats_window(self):
+        from stats_window import StatsWindow
+        StatsWindow(self.root)
 
+    def open_grid_view(self):
+        if self.grid_window is not None and self.grid_window.winfo_exists():
+            self.grid_window.lift()
+            self.grid_window.refresh()
+            return
+        self.grid_window = GridWindow(self.root, self)
+
+    @timed('load_all_images')
     def load_all_images(self):
-        image_paths = []
-        for year in YEAR_FOLDERS:
-            folder = os.path.join(BASE_DIR, year)
-            if os.path.isdir(folder):
-                for fname in os.listdir(folder):
-                    if fname.lower().endswith(IMAGE_EXTENSIONS):
-                        image_paths.append(os.path.join(folder, fname))
-        return image_paths
+        if self.client is not None:
+            return self.client.catalog_paths()
+        return scan_catalog(BASE_DIR, YEAR_FOLDERS, IMAGE_EXTENSIONS)
 
+    @timed('display_image')
     def display_image(self):
         paths = self.get_active_image_list()
         if not paths:
-            self.image_label.config(text='No images found!')
+            self.image_label.config(text='No images found!' if self.catalog_loaded else 'Loading catalog...')
             self.meta_label.config(text='')
-            self.root.title('GI JOE Collectables Viewer')
+            self.update_title()
             return
         idx = self.get_active_index()
         img_path = paths[idx]
-        img = Image.open(img_path)
-        img.thumbnail((550, 550))
-        self.tk_img = ImageTk.PhotoImage(img)
-        self.image_label.config(image=self.tk_img, text='')
-        mode = 'WANT LIST' if self.want_mode else 'ALL'
-        self.root.title(f'GI JOE Collectables Viewer - {self.username} [{mode}]')
-        rel_path = os.path.relpath(img_path, BASE_DIR).replace('\\', '/')
-        meta = self.figure_meta.get(rel_path)
+        img = self.prefetcher.get(img_path)
+        if img is not None:
+            self.show_image(img)
+        else:
+            # Decode off the Tk thread; show_loaded_image picks it up when ready
+            self.tk_img = None
+            self.image_label.config(image='', text='Loading...')
+            self.prefetcher.when_ready(img_path, self.show_loaded_image)
+        self.prefetcher.request(paths, idx)
+        self.update_title()
+        rec = self.catalog.record(img_path)
+        meta = rec.meta if rec else None
         if meta:
             name = meta.get('name', 'Unknown')
             year = meta.get('year', 'Unknown')
@@ -129,24 +372,33 @@ class GIJoeApp:
             meta_text = "Name: Unknown\nYear: Unknown\nWeapons: Unknown"
         self.meta_label.config(text=meta_text)
 
+    def show_image(self, img):
+        from PIL import ImageTk
+        with timer('photoimage'):
+            self.tk_img = ImageTk.PhotoImage(img)
+        self.image_label.config(image=self.tk_img, text='')
+
+    def show_loaded_image(self, img_path, img):
+        paths = self.get_active_image_list()
+        if not paths or paths[self.get_active_index()] != img_path:
+            return
+        if img is None:
+            self.image_label.config(image='', text='Failed to load image')
+        else:
+            self.show_image(img)
+
     def next_image(self):
         paths = self.get_active_image_list()
         if not paths:
             return
-        if self.want_mode:
-            self.want_index = (self.want_index + 1) % len(paths)
-        else:
-            self.current_index = (self.current_index + 1) % len(paths)
+        self.set_active_index((self.get_active_index() + 1) % len(paths))
         self.display_image()
 
     def prev_image(self):
         paths = self.get_active_image_list()
         if not paths:
             return
-        if self.want_mode:
-            self.want_index = (self.want_index - 1) % len(paths)
-        else:
-            self.current_index = (self.current_index - 1) % len(paths)
+        self.set_active_index((self.get_active_index() - 1) % len(paths))
         self.display_image()
 
     def mark_want(self):
@@ -160,72 +412,158 @@ class GIJoeApp:
 
     def categorize_current(self, category):
         img_path = self.get_active_image_list()[self.get_active_index()]
-        for cat in self.categories:
-            self.categories[cat].discard(img_path)
-        self.categories[category].add(img_path)
+        self.category_store.assign([img_path], category)
         self.save_categories()
-        self.refresh_want_list()
-        self.next_image()
+        if self.update_views(img_path, category):
+            # The figure left the want list, so the cursor already shows the next one
+            self.display_image()
+        else:
+            self.next_image()
+
+    def categorize_paths(self, paths, category):
+        # Batch version for the grid: one journal record and one flush for all of them
+        if not paths:
+            return
+        self.category_store.assign(paths, category)
+        self.save_categories()
+        for path in paths:
+            self.update_views(path, category)
+        self.display_image()
 
+    def update_views(self, path, category):
+        # O(log N) view update that keeps want_index on the same figure.
+        # Returns True when the current want-mode figure dropped out of the view.
+        self.catalog.set_category(path, category)
+        if self.facet_index is not None:
+            self.facet_index.set_category(self.catalog.record(path).index, category)
+        change = self.category_views.assign(path, category).get('want')
+        left_view = False
+        if change:
+            kind, rank = change
+            if kind == 'added' and rank <= self.want_index and len(self.want_image_paths) > 1:
+                self.want_index += 1
+            elif kind == 'removed' and rank < self.want_index:
+                self.want_index -= 1
+            elif kind == 'removed' and rank == self.want_index:
+                left_view = self.want_mode
+        if self.want_index >= len(self.want_image_paths):
+            self.want_index = 0
+        return left_view
+
+    @timed('save_categories')
     def save_categories(self):
-        user_dir = os.path.join(os.path.dirname(__file__), 'users', self.username)
-        os.makedirs(user_dir, exist_ok=True)
-        for cat in self.categories:
-            file_path = os.path.join(user_dir, f'{cat}.json')
-            with open(file_path, 'w') as f:
-                json.dump(list(self.categories[cat]), f, indent=2)
+        # Journals the pending assignments after a short debounce
+        self.category_store.save()
+
+    @timed('load_categories')
+    def read_categories(self):
+        if self.client is not None:
+            from service_client import RemoteCategoryStore
+            store = RemoteCategoryStore(self.client, self.username, root=self.root)
+        else:
+            store = CategoryStore(self.username, root=self.root)
+        store.load()
+        return store
 
     def load_categories(self):
-        user_dir = os.path.join(os.path.dirname(__file__), 'users', self.username)
-        for cat in self.categories:
-            file_path = os.path.join(user_dir, f'{cat}.json')
-            try:
-                with open(file_path, 'r') as f:
-                    self.categories[cat] = set(json.load(f))
-            except Exception:
-                self.categories[cat] = set()
+        try:
+            store = self.read_categories()
+        except Exception as e:
+            # As in _metadata_worker: categorizing stays disabled rather than
+            # overwriting files we could not read
+            messagebox.showerror('Load Error', f'Failed to load your categories: {e}')
+        else:
+            self.category_store = store
+            self.categories = store.categories
+            self.catalog.set_categories(self.categories)
         self.refresh_want_list()
 
+    @timed('load_figure_metadata')
     def load_figure_metadata(self):
         import json
         import os
-        meta_path = os.path.join(os.path.dirname(__file__), 'figures.json')
-        if os.path.exists(meta_path):
+        if self.client is not None:
+            return self.client.figures()
+        if os.path.exists(FIGURES_FILE):
             try:
-                with open(meta_path, 'r') as f:
+                with open(FIGURES_FILE, 'r') as f:
                     return json.load(f)
             except Exception:
                 return {}
         return {}
 
+    def want_keys(self):
+        from seller_compare import build_keys
+        wanted = {self.catalog.rel_path(p) for p in self.categories['want']}
+        return build_keys(self.image_paths, self.figure_meta, BASE_DIR, wanted=wanted), wanted
+
     def compare_with_seller(self):
-        seller_file = filedialog.askopenfilename(title='Select Seller List', filetypes=[('JSON or CSV', '*.json *.csv')])
+        from seller_compare import match_file
+        seller_file = filedialog.askopenfilename(title='Select Seller List', filetypes=[('Seller lists', '*.json *.jsonl *.csv *.txt')])
         if not seller_file:
             return
-        seller_wants = set()
-        if seller_file.endswith('.json'):
-            try:
-                with open(seller_file, 'r') as f:
-                    seller_wants = set(json.load(f))
-            except Exception as e:
-                messagebox.showerror('Error', f'Failed to load seller JSON: {e}')
-                return
-        elif seller_file.endswith('.csv'):
-            try:
-                with open(seller_file, 'r') as f:
-                    for line in f:
-                        seller_wants.add(line.strip())
-            except Exception as e:
-                messagebox.showerror('Error', f'Failed to load seller CSV: {e}')
-                return
-        matches = self.categories['want'] & seller_wants
+        keys, _ = self.want_keys()
+        try:
+            matches, _ = match_file(seller_file, keys)
+        except Exception as e:
+            messagebox.showerror('Error', f'Failed to load seller list: {e}')
+            return
         if not matches:
             messagebox.showinfo('No Matches', 'No images you want are available from this seller.')
         else:
-            match_list = '\n'.join(os.path.basename(m) for m in matches)
+            match_list = '\n'.join(os.path.basename(m) for m in sorted(matches))
             messagebox.showinfo('Matches', f'Images you want from this seller:\n\n{match_list}')
 
+    def compare_with_seller_folder(self):
+        from seller_compare import compare_sellers, format_report, seller_files
+        folder = filedialog.askdirectory(title='Select Folder of Seller Lists')
+        if not folder:
+            return
+        files = seller_files(folder)
+        if not files:
+            messagebox.showinfo('No Seller Lists', 'No seller lists found in this folder.')
+            return
+        keys, wanted = self.want_keys()
+        self.root.config(cursor='watch')
+        self.root.update_idletasks()
+        try:
+            report = compare_sellers(files, keys, len(wanted))
+        finally:
+            self.root.config(cursor='')
+        messagebox.showinfo('Seller Ranking', f'Sellers covering the most of your wants:\n\n{format_report(report, limit=20)}')
+
+    def find_trades(self):
+        from trade_match import TradeMatcher, format_trades
+        if self.category_store is None:
+            messagebox.showinfo('Trades', 'Your categories are still loading.')
+            return
+        if self.trades_running:
+            return
+        # Our own pending changes must be on disk before the users/ scan
+        self.category_store.flush()
+        if self.trade_matcher is None:
+            self.trade_matcher = TradeMatcher(BASE_DIR)
+        matcher, username = self.trade_matcher, self.username
+
+        def search():
+            # Only users whose files changed since the last search are re-read
+            matcher.refresh()
+            return format_trades(username, matcher.mutual_trades(username), matcher.trade_cycles(username))
+
+        def done(report, error):
+            self.trades_running = False
+            self.root.config(cursor='')
+            if error is not None:
+                messagebox.showerror('Trades', f'Trade search failed: {error}')
+            else:
+                messagebox.showinfo('Trades', report)
+
+        self.trades_running = True
+        self.root.config(cursor='watch')
+        run_in_background(self.root, search, done)
+
     def toggle_want_mode(self):
+        self.facet_paths = self.facet_query = None
         self.want_mode = not self.want_mode
         if self.want_mode:
             self.want_toggle_btn.config(text='Show Wants Only: ON', bg='#FFD700')
@@ -235,61 +573,254 @@ class GIJoeApp:
             self.current_index = 0
         self.display_image()
 
+    @timed('refresh_want_list')
     def refresh_want_list(self):
-        self.want_image_paths = [p for p in self.image_paths if p in self.categories['want']]
+        # Full O(N) rebuild after a re-sort or reload; single changes go through update_views
+        self.category_views = CategoryViews(self.image_paths, self.categories)
+        self.want_image_paths = self.category_views['want']
         # If want_mode is active and the want list shrinks, reset want_index if needed
         if self.want_mode and self.want_index >= len(self.want_image_paths):
             self.want_index = 0
 
     def get_active_image_list(self):
+        if self.facet_paths is not None:
+            return self.facet_paths
         if self.want_mode:
             return self.want_image_paths
         return self.image_paths
 
-    def sort_by_year(self):
-        def get_year(path):
-            rel_path = os.path.relpath(path, BASE_DIR).replace('\\', '/')
-            meta = self.figure_meta.get(rel_path, {})
-            return meta.get('year', 0)
-        self.image_paths.sort(key=get_year)
-        self.want_image_paths.sort(key=get_year)
-        self.current_sort = 'year'
+    def rebuild_image_list(self):
+        # The catalog in the current sort order, less any hidden duplicates.
+        # Applies a cached permutation from the catalog index instead of re-sorting.
+        if self.sort_keys is None:
+            paths = [rec.path for rec in self.catalog.records]
+        else:
+            paths = self.catalog.sorted_paths(self.sort_keys)
+        if self.hidden_paths:
+            paths = [p for p in paths if p not in self.hidden_paths]
+        self.image_paths[:] = paths
+        self.refresh_want_list()
+        if self.facet_query is not None:
+            self.facet_paths = self.filter_facets(self.facet_query)
+
+    @timed('sort_by')
+    def sort_by(self, keys, label):
+        self.current_sort = label
+        self.sort_keys = keys
+        self.rebuild_image_list()
         self.current_index = 0
         self.want_index = 0
+        self.facet_pos = 0
         self.display_image()
 
+    def sort_by_year(self):
+        self.sort_by(('year',), 'year')
+
     def sort_by_name(self):
-        def get_name(path):
-            rel_path = os.path.relpath(path, BASE_DIR).replace('\\', '/')
-            meta = self.figure_meta.get(rel_path, {})
-            return meta.get('name', '')
-        self.image_paths.sort(key=get_name)
-        self.want_image_paths.sort(key=get_name)
-        self.current_sort = 'name'
-        self.current_index = 0
-        self.want_index = 0
-        self.display_image()
+        self.sort_by(('name',), 'name')
 
     def sort_by_category(self):
-        def get_cat(path):
-            if path in self.categories['want']:
-                return 0
-            elif path in self.categories['have']:
-                return 1
-            elif path in self.categories['dont_want']:
-                return 2
-            return 3
-        self.image_paths.sort(key=get_cat)
-        self.want_image_paths.sort(key=get_cat)
-        self.current_sort = 'category'
-        self.current_index = 0
-        self.want_index = 0
-        self.display_image()
+        self.sort_by(('category',), 'category')
+
+    def sort_by_year_name(self):
+        self.sort_by(('year', 'name'), 'year_name')
 
     def get_active_index(self):
+        if self.facet_paths is not None:
+            return self.facet_pos
         return self.want_index if self.want_mode else self.current_index
 
-def main():
+    def set_active_index(self, index):
+        if self.facet_paths is not None:
+            self.facet_pos = index
+        elif self.want_mode:
+            self.want_index = index
+        else:
+            self.current_index = index
+
+    def current_path(self):
+        paths = self.get_active_image_list()
+        index = self.get_active_index()
+        return paths[index] if index < len(paths) else None
+
+    def restore_position(self, path, index):
+        # Back onto `path` in the updated active list, or the same slot if it is gone
+        paths = self.get_active_image_list()
+        try:
+            self.set_active_index(paths.index(path))
+        except ValueError:
+            self.set_active_index(min(index, max(len(paths) - 1, 0)))
+
+    def get_facet_index(self):
+        if self.facet_index is None:
+            from facets import FacetIndex
+            self.facet_index = FacetIndex(self.catalog)
+        return self.facet_index
+
+    def open_facet_filter(self):
+        if not (self.catalog_loaded and self.meta_loaded and self.categories_loaded):
+            messagebox.showinfo('Filter', 'The catalog is still loading.')
+            return
+        from service_client import ServiceError
+        try:
+            # A thin client leaves the facet bitsets to the service
+            values = self.client.facet_values() if self.client is not None else self.get_facet_index().values()
+            query = FacetFilterDialog(self.root, values).result
+            if query:
+                self.apply_facet_filter(query)
+        except (ServiceError, OSError) as e:
+            messagebox.showerror('Filter', f'Filter failed: {e}')
+
+    def remote_facet_paths(self, query):
+        # The service answers against its own indexes and this user's
+        # categories there, so our pending assignments go out first
+        if self.category_store is not None:
+            self.category_store.flush()
+        keys = self.sort_keys
+        if not keys or set(keys) <= {'year', 'name'}:
+            return self.client.facet_paths(user=self.username, sort=list(keys) if keys else None, **query)
+        # Category order is ours; the service only decides membership
+        matched = set(self.client.facet_paths(user=self.username, **query))
+        return [p for p in self.catalog.sorted_paths(keys) if p in matched]
+
+    def filter_facets(self, query):
+        if self.client is not None:
+            paths = self.remote_facet_paths(query)
+        else:
+            paths = self.get_facet_index().filter_paths(self.sort_keys, **query)
+        if self.hidden_paths:
+            paths = [p for p in paths if p not in self.hidden_paths]
+        return paths
+
+    def apply_facet_filter(self, query):
+        # Results become their own active list next to ALL and WANT LIST
+        self.facet_query = query
+        self.facet_paths = self.filter_facets(query)
+        self.facet_pos = 0
+        if self.want_mode:
+            self.want_mode = False
+            self.want_toggle_btn.config(text='Show Wants Only: OFF', bg='#eee')
+        self.display_image()
+
+    def clear_facet_filter(self):
+        if self.facet_paths is None:
+            return
+        self.facet_paths = self.facet_query = None
+        self.display_image()
+
+    def start_watcher(self):
+        # Live updates for scans landing in the year folders and figures.json
+        # edits; a thin client leaves the files to the service
+        from fs_watch import TkWatch
+        if self.watch is None and self.client is None:
+            folders = [os.path.join(BASE_DIR, year) for year in YEAR_FOLDERS]
+            self.watch = TkWatch(self.root, folders + [FIGURES_FILE], self.apply_file_changes)
+
+    def apply_file_changes(self, changed):
+        # Applies only the added/removed images and changed figures.json
+        # entries, keeping the viewer on the figure it was showing
+        from fs_watch import diff_folder, diff_mapping
+        current, index = self.current_path(), self.get_active_index()
+        added, removed = [], []
+        folders = [os.path.join(BASE_DIR, year) for year in YEAR_FOLDERS]
+        if any(folder in changed for folder in folders):
+            known = {}
+            for rec in self.catalog.records:
+                known.setdefault(os.path.dirname(rec.path), set()).add(rec.path)
+            for folder in folders:
+                if folder in changed:
+                    folder_added, folder_removed = diff_folder(folder, known.get(folder, set()), IMAGE_EXTENSIONS)
+                    added.extend(folder_added)
+                    removed.extend(folder_removed)
+        meta_keys = set()
+        if FIGURES_FILE in changed:
+            figure_meta = self.load_figure_metadata()
+            changed_keys, removed_keys = diff_mapping(self.figure_meta, figure_meta)
+            meta_keys = changed_keys | removed_keys
+            if meta_keys:
+                self.figure_meta = figure_meta
+                self.catalog.update_metadata(figure_meta, meta_keys)
+        if not (added or removed or meta_keys):
+            return
+        if removed:
+            self.catalog.remove(removed)
+        if added:
+            self.catalog.add(added)
+            for path in added:
+                for cat in ('want', 'have', 'dont_want'):
+                    if path in self.categories[cat]:
+                        self.catalog.set_category(path, cat)
+        self.facet_index = None
+        if added or removed:
+            self.duplicate_groups = None
+            if self.hidden_paths:
+                from dedupe import hidden_duplicates
+                self.hidden_paths = hidden_duplicates(self.find_duplicates())
+        resorted = meta_keys and self.sort_keys is not None and ({'year', 'name'} & set(self.sort_keys))
+        if added and not removed and not resorted and self.sort_keys is None and not self.hidden_paths:
+            # New scans in load order just extend the views
+            self.category_views.extend(added)
+            if self.facet_query is not None:
+                self.facet_paths = self.filter_facets(self.facet_query)
+        elif added or removed or resorted:
+            self.rebuild_image_list()
+        elif self.facet_query is not None:
+            self.facet_paths = self.filter_facets(self.facet_query)
+        self.restore_position(current, index)
+        self.display_image()
+        if self.grid_window is not None:
+            self.grid_window.refresh(keep_position=True, keep_selection=True)
+
+    def find_duplicates(self):
+        # Hashes are cached by path and mtime, so only new scans get decoded
+        from dedupe import compute_hashes, duplicate_groups
+        if self.duplicate_groups is None:
+            paths = [rec.path for rec in self.catalog.records]
+            self.root.config(cursor='watch')
+            self.root.update_idletasks()
+            try:
+                self.duplicate_groups = duplicate_groups(paths, compute_hashes(paths))
+            finally:
+                self.root.config(cursor='')
+        return self.duplicate_groups
+
+    def toggle_hide_duplicates(self):
+        from dedupe import hidden_duplicates
+        if not self.catalog_loaded:
+            self.hide_duplicates_var.set(False)
+            messagebox.showinfo('Duplicates', 'The catalog is still loading.')
+            return
+        current, index = self.current_path(), self.get_active_index()
+        self.hidden_paths = hidden_duplicates(self.find_duplicates()) if self.hide_duplicates_var.get() else set()
+        self.rebuild_image_list()
+        self.restore_position(current, index)
+        self.display_image()
+
+    def show_duplicate_report(self):
+        if not self.catalog_loaded:
+            messagebox.showinfo('Duplicates', 'The catalog is still loading.')
+            return
+        groups = self.find_duplicates()
+        if not groups:
+            messagebox.showinfo('Duplicates', 'No duplicate scans found.')
+            return
+        lines = []
+        for group in groups[:20]:
+            lines.append(self.catalog.rel_path(group[0]))
+            lines.extend(f'    {self.catalog.rel_path(p)}' for p in group[1:])
+        if len(groups) > 20:
+            lines.append(f'... and {len(groups) - 20} more groups')
+        duplicates = sum(len(g) - 1 for g in groups)
+        messagebox.showinfo('Duplicates', f'{duplicates} duplicate scans in {len(groups)} groups:\n\n' + '\n'.join(lines))
+
+def main(argv=None):
+    import argparse
+    from service_client import SERVER_ENV, ServiceClient, server_url
+    parser = argparse.ArgumentParser(description='GI JOE collectables viewer.')
+    parser.add_argument('--server', help=f'catalog_service URL to run against (default: ${SERVER_ENV}, else local files)')
+    args = parser.parse_args(argv)
+    url = server_url(args.server)
+    client = ServiceClient(url) if url else None
     root = tk.Tk()
     # User selection popup
     username = UserSelectionDialog(root).result
@@ -297,7 +828,7 @@ def main():
     if not username:
         root.destroy()
         return
-    app = GIJoeApp(root, username)
+    app = GIJoeApp(root, username, client=client)
     root.mainloop()
 
 # --- User selection dialog ---
@@ -310,20 +841,151 @@ class UserSelectionDialog(tk.simpledialog.Dialog):
     def apply(self):
         self.result = self.entry.get().strip()
 
+# --- Faceted filter dialog ---
+class FacetFilterDialog(tk.simpledialog.Dialog):
+    CATEGORY_CHOICES = ('any', 'want', 'have', 'dont_want', 'none')
+    VEHICLE_CHOICES = ('any', 'with vehicle', 'without vehicle')
+
+    def __init__(self, master, values):
+        self.values = values
+        self.result = None
+        super().__init__(master, title='Faceted Filter')
+
+    def body(self, master):
+        tk.Label(master, text="Years (comma separated):").grid(row=0, column=0, sticky='w')
+        self.years_entry = tk.Entry(master)
+        self.years_entry.grid(row=0, column=1)
+        tk.Label(master, text="Weapons (comma separated):").grid(row=1, column=0, sticky='w')
+        self.weapons_entry = tk.Entry(master)
+        self.weapons_entry.grid(row=1, column=1)
+        tk.Label(master, text="Vehicle:").grid(row=2, column=0, sticky='w')
+        self.vehicle_var = tk.StringVar(value='any')
+        tk.OptionMenu(master, self.vehicle_var, *self.VEHICLE_CHOICES, *self.values['vehicles']).grid(row=2, column=1, sticky='we')
+        tk.Label(master, text="Category is:").grid(row=3, column=0, sticky='w')
+        self.category_var = tk.StringVar(value='any')
+        tk.OptionMenu(master, self.category_var, *self.CATEGORY_CHOICES).grid(row=3, column=1, sticky='we')
+        tk.Label(master, text="Category is not:").grid(row=4, column=0, sticky='w')
+        self.exclude_var = tk.StringVar(value='any')
+        tk.OptionMenu(master, self.exclude_var, *self.CATEGORY_CHOICES).grid(row=4, column=1, sticky='we')
+        return self.years_entry
+
+    def apply(self):
+        def split(text):
+            return [part.strip() for part in text.split(',') if part.strip()]
+        vehicle = self.vehicle_var.get()
+        vehicle = {'any': None, 'with vehicle': True, 'without vehicle': False}.get(vehicle, vehicle)
+        category = self.category_var.get()
+        exclude = self.exclude_var.get()
+        self.result = {
+            'years': split(self.years_entry.get()),
+            'weapons': split(self.weapons_entry.get()),
+            'vehicle': vehicle,
+            'categories': [category] if category != 'any' else None,
+            'exclude_categories': [exclude] if exclude != 'any' else None,
+        }
+
+# --- Grid view window ---
+class GridWindow(tk.Toplevel):
+    # Contact sheet of the viewer's active list for triaging many figures at once.
+    # Click selects, Ctrl-click toggles, Shift-click extends, double-click opens
+    # the figure in the main viewer.
+    OUTLINES = {'want': '#4CAF50', 'have': '#2196F3', 'dont_want': '#F44336'}
+
+    def __init__(self, master, app):
+        super().__init__(master)
+        self.title(f'Grid View - {app.username}')
+        self.geometry('760x640')
+        self.app = app
+        self.prefetcher = ImagePrefetcher(self, size=GRID_THUMB_SIZE, capacity=GRID_CACHE_SIZE,
+                                          loader=app.client.thumbnail if app.client else None)
+
+        btn_frame = tk.Frame(self)
+        btn_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=5)
+        self.buttons = [
+            tk.Button(btn_frame, text="Don't Want", command=lambda: self.categorize('dont_want'), width=12, bg='#F44336', fg='white'),
+            tk.Button(btn_frame, text='Have It', command=lambda: self.categorize('have'), width=12, bg='#2196F3', fg='white'),
+            tk.Button(btn_frame, text='Want It', command=lambda: self.categorize('want'), width=12, bg='#4CAF50', fg='white'),
+        ]
+        for btn in self.buttons:
+            btn.pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text='Select All', command=lambda: self.grid.select_all()).pack(side=tk.RIGHT, padx=5)
+        self.status = tk.Label(self, text='', anchor='w')
+        self.status.pack(side=tk.BOTTOM, fill=tk.X, padx=5)
+
+        self.grid = ThumbnailGrid(self, self.prefetcher, label=self.figure_label, outline=self.figure_outline)
+        self.grid.pack(fill=tk.BOTH, expand=True)
+        self.grid.bind('<<GridSelect>>', lambda e: self.update_status())
+        self.grid.bind('<<GridActivate>>', lambda e: self.show_in_viewer())
+        self.protocol('WM_DELETE_WINDOW', self.close)
+        self.refresh()
+
+    def figure_label(self, path):
+        rec = self.app.catalog.record(path)
+        if rec is not None and rec.name:
+            return rec.name[:20]
+        return os.path.basename(path)[:20]
+
+    def figure_outline(self, path):
+        categories = self.app.categories
+        for cat in ('want', 'have', 'dont_want'):
+            if path in categories[cat]:
+                return self.OUTLINES[cat]
+        return '#cccccc'
+
+    def refresh(self, keep_position=False, keep_selection=False):
+        # Snapshot of the viewer's active list; want-mode removals disappear on refresh
+        selected = set(self.grid.selected_paths()) if keep_selection else ()
+        items = list(self.app.get_active_image_list())
+        self.grid.set_items(items, keep_position=keep_position)
+        if selected:
+            self.grid.selected = {i for i, path in enumerate(items) if path in selected}
+            self.grid.redraw()
+        self.update_status()
+
+    def update_status(self):
+        selected = len(self.grid.selected)
+        self.status.config(text=f'{len(self.grid.items)} figures, {selected} selected')
+        state = tk.NORMAL if selected and self.app.category_store is not None else tk.DISABLED
+        for btn in self.buttons:
+            btn.config(state=state)
+
+    def categorize(self, category):
+        paths = self.grid.selected_paths()
+        if not paths or self.app.category_store is None:
+            return
+        self.app.categorize_paths(paths, category)
+        self.refresh(keep_position=True)
+
+    def show_in_viewer(self):
+        paths = self.grid.selected_paths()
+        active = self.app.get_active_image_list()
+        if paths and paths[0] in active:
+            self.app.set_active_index(active.index(paths[0]))
+            self.app.display_image()
+
+    def close(self):
+        self.prefetcher.shutdown()
+        self.app.grid_window = None
+        self.destroy()
+
 # --- Shop window scaffold ---
 class ShopWindow(tk.Toplevel):
-    def __init__(self, master, username):
+    def __init__(self, master, username, app=None):
         super().__init__(master)
         self.title(f"Shop - {username}")
         self.geometry('500x600')
         self.username = username
+        self.app = app
+        self.items = None
+        self.matches = None  # listing index -> (figure rel_path, score)
+        self.matching = False
         self.want_only = tk.BooleanVar(value=False)
 
         top_frame = tk.Frame(self)
         top_frame.pack(fill=tk.X, pady=5)
         tk.Button(top_frame, text="Add Item", command=self.add_item_dialog).pack(side=tk.LEFT, padx=5)
         tk.Checkbutton(top_frame, text="Show Want List Only", variable=self.want_only, command=self.refresh_items).pack(side=tk.LEFT)
-        self.items_listbox = tk.Listbox(self, width=60, height=25)
+        self.items_listbox = VirtualList(self, width=60, height=25)
         self.items_listbox.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
         self.refresh_items()
 
@@ -331,10 +993,64 @@ class ShopWindow(tk.Toplevel):
         # Simple dialog for adding item (to be implemented)
         messagebox.showinfo("Add Item", "Add item dialog coming soon!")
 
+    def load_items(self):
+        if self.items is None:
+            try:
+                if self.app is not None and self.app.client is not None:
+                    self.items = self.app.client.sale_search()
+                else:
+                    self.items = load_sale_store(SALE_ITEMS_FILE)
+            except Exception:
+                self.items = []
+        return self.items
+
+    def match_listings(self):
+        # Fuzzy-link every listing to a catalog figure once per window, on a
+        # worker thread; the list shows a placeholder until it is done
+        from fuzzy_match import FuzzyMatcher
+        if self.matching:
+            return
+        self.matching = True
+        self.items_listbox.set_items(["[Matching listings to the catalog...]"], str)
+        catalog, items = self.app.catalog, self.items
+
+        def match():
+            matcher = FuzzyMatcher.from_catalog(catalog)
+            names = items.names if hasattr(items, 'names') else [item.get('name', '') for item in items]
+            return matcher.best_matches(names)
+
+        def done(matches, error):
+            self.matching = False
+            if error is not None:
+                self.want_only.set(False)
+                messagebox.showerror("Shop", f"Could not match listings to the catalog: {error}")
+            else:
+                self.matches = matches
+            self.refresh_items()
+
+        run_in_background(self, match, done)
+
+    def figure_name(self, rel_path):
+        meta = self.app.figure_meta.get(rel_path) or {}
+        return meta.get('name', rel_path)
+
     def refresh_items(self):
-        # Load items and filter if needed (to be implemented)
-        self.items_listbox.delete(0, tk.END)
-        self.items_listbox.insert(tk.END, "[Shop items will appear here]")
+        items = self.load_items()
+        if not items:
+            self.items_listbox.set_items(["[No shop items found]"], str)
+            return
+        if self.want_only.get() and self.app is not None:
+            if self.matches is None:
+                self.match_listings()
+                return
+            wanted = {self.app.catalog.rel_path(p) for p in self.app.categories['want']}
+            rows = [(items[i], rel_path) for i, (rel_path, _) in sorted(self.matches.items()) if rel_path in wanted]
+            if not rows:
+                self.items_listbox.set_items(["[No listings match your want list]"], str)
+                return
+            self.items_listbox.set_items(rows, lambda row: f"{row[0]['name']} (${row[0]['price']}) - {self.figure_name(row[1])}")
+        else:
+            self.items_listbox.set_items(items, lambda item: f"{item['name']} (${item['price']})")
     def sort_by_year(self):
         def get_year(path):
             rel_path = os.path.relpath(path, BASE_DIR).replace('\\', '/')
@@ -0,0 +1,143 @@
+class FenwickTree:
+    # Counts of members by base position; rank and select are O(log N)
+    def __init__(self, flags=()):
+        self.flags = bytearray(flags)
+        n = len(self.flags)
+        self.tree = [0] * (n + 1)
+        for i in range(1, n + 1):
+            self.tree[i] += self.flags[i - 1]
+            j = i + (i & -i)
+            if j <= n:
+                self.tree[j] += self.tree[i]
+        self.count = sum(self.flags)
+        self.step = 1 << max(0, n.bit_length() - 1)
+
+    def __len__(self):
+        return len(self.flags)
+
+    def append(self, flag):
+        self.flags.append(flag)
+        n = len(self.flags)
+        low = n & -n
+        self.tree.append(flag + self.prefix(n - 1) - self.prefix(n - low))
+        self.count += flag
+        if n >= self.step * 2:
+            self.step *= 2
+
+    def set(self, pos, flag):
+        delta = flag - self.flags[pos]
+        if not delta:
+            return False
+        self.flags[pos] = flag
+        self.count += delta
+        i = pos + 1
+        n = len(self.flags)
+        while i <= n:
+            self.tree[i] += delta
+            i += i & -i
+        return True
+
+    def prefix(self, pos):
+        # Number of members at base positions < pos
+        total = 0
+        while pos > 0:
+            total += self.tree[pos]
+            pos -= pos & -pos
+        return total
+
+    def select(self, k):
+        # Base position of the k-th member (0-based)
+        pos = 0
+        step = self.step
+        n = len(self.flags)
+        while step:
+            nxt = pos + step
+            if nxt <= n and self.tree[nxt] <= k:
+                pos = nxt
+                k -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+
+class OrderedView:
+    # The members of one category in the order of the shared base list
+    def __init__(self, owner, flags=()):
+        self.owner = owner
+        self.tree = FenwickTree(flags)
+
+    def __len__(self):
+        return self.tree.count
+
+    def __bool__(self):
+        return self.tree.count > 0
+
+    def __getitem__(self, k):
+        n = self.tree.count
+        if k < 0:
+            k += n
+        if not 0 <= k < n:
+            raise IndexError('view index out of range')
+        return self.owner.base[self.tree.select(k)]
+
+    def __iter__(self):
+        base = self.owner.base
+        for pos, flag in enumerate(self.tree.flags):
+            if flag:
+                yield base[pos]
+
+    def __contains__(self, path):
+        pos = self.owner.position.get(path)
+        return pos is not None and bool(self.tree.flags[pos])
+
+    def index(self, path):
+        pos = self.owner.position.get(path)
+        if pos is None or not self.tree.flags[pos]:
+            raise ValueError(f'{path!r} is not in view')
+        return self.tree.prefix(pos)
+
+    def _set(self, path, flag):
+        # Returns the rank the path had (removal) or now has (insertion)
+        pos = self.owner.position.get(path)
+        if pos is None or not self.tree.set(pos, flag):
+            return None
+        return self.tree.prefix(pos)
+
+
+class CategoryViews:
+    # want/have/dont_want views over one ordering of the catalog
+    def __init__(self, base, categories):
+        self.base = base
+        self.categories = categories
+        self.position = {}
+        self.views = {}
+        self.rebuild()
+
+    def __getitem__(self, category):
+        return self.views[category]
+
+    def rebuild(self):
+        # O(N): after a re-sort of base or a wholesale category reload
+        self.position = {path: i for i, path in enumerate(self.base)}
+        for cat, members in self.categories.items():
+            flags = [path in members for path in self.base]
+            view = self.views.get(cat)
+            if view is None:
+                self.views[cat] = OrderedView(self, flags)
+            else:
+                view.tree = FenwickTree(flags)
+
+    def extend(self, paths):
+        for path in paths:
+            self.position[path] = len(self.base)
+            self.base.append(path)
+            for cat, view in self.views.items():
+                view.tree.append(path in self.categories[cat])
+
+    def assign(self, path, category):
+        # Mirror a category change; returns {category: ('added'|'removed', rank)}
+        changes = {}
+        for cat, view in self.views.items():
+            rank = view._set(path, cat == category)
+            if rank is not None:
+                changes[cat] = ('added' if cat == category else 'removed', rank)
+        return changes
@@ -0,0 +1,142 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Candidate lists are intersected for at most this many of the rarest trigrams;
+# the substring check on the survivors does the rest
+MAX_TRIGRAM_PROBES = 4
+
+
+def parse_price(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def narrows(old, new):
+    # True when every match of query `new` is also a match of `old`;
+    # queries are (name, min_price, max_price) tuples
+    old_name, old_min, old_max = old
+    new_name, new_min, new_max = new
+    if (old_name or '').lower() not in (new_name or '').lower():
+        return False
+    if old_min is not None and (new_min is None or new_min < old_min):
+        return False
+    if old_max is not None and (new_max is None or new_max > old_max):
+        return False
+    return True
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SaleIndex:
+    # Built once from the sale items; search returns item positions in file order
+    def __init__(self, items):
+        self.items = items
+        if hasattr(items, 'names') and hasattr(items, 'prices'):
+            # Columnar SaleStore: skip building a mapping per listing
+            self.names = [name.lower() for name in items.names]
+            self.prices = array('d', (0.0 if p != p else p for p in items.prices))
+        else:
+            self.names = [str(item.get('name', '')).lower() for item in items]
+            self.prices = array('d', (parse_price(item.get('price')) for item in items))
+        self.postings = {}
+        for i, name in enumerate(self.names):
+            for gram in trigrams(name):
+                posting = self.postings.get(gram)
+                if posting is None:
+                    posting = self.postings[gram] = array('i')
+                posting.append(i)
+        self.price_order = array('i', sorted(range(len(items)), key=self.prices.__getitem__))
+        self.sorted_prices = array('d', (self.prices[i] for i in self.price_order))
+
+    def __len__(self):
+        return len(self.items)
+
+    def apply_changes(self, items, dropped, added):
+        # Switch to a new load of the listings whose unchanged rows kept their
+        # positions: only the dropped (removed or edited) and added positions
+        # are unindexed/indexed. Postings, and price ties, stay in position
+        # order, so each change is a bisect plus one array shift.
+        names, prices, postings = self.names, self.prices, self.postings
+        price_order, sorted_prices = self.price_order, self.sorted_prices
+        for i in dropped:
+            for gram in trigrams(names[i]):
+                posting = postings[gram]
+                del posting[bisect_left(posting, i)]
+                if not posting:
+                    del postings[gram]
+            price = prices[i]
+            k = bisect_left(price_order, i, bisect_left(sorted_prices, price), bisect_right(sorted_prices, price))
+            del price_order[k]
+            del sorted_prices[k]
+        count = len(items)
+        del names[count:]
+        del prices[count:]
+        names.extend([''] * (count - len(names)))
+        prices.extend([0.0] * (count - len(prices)))
+        for i in added:
+            name = names[i] = items.names[i].lower()
+            price = items.prices[i]
+            price = prices[i] = 0.0 if price != price else price
+            for gram in trigrams(name):
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array('i')
+                posting.insert(bisect_left(posting, i), i)
+            k = bisect_left(price_order, i, bisect_left(sorted_prices, price), bisect_right(sorted_prices, price))
+            price_order.insert(k, i)
+            sorted_prices.insert(k, price)
+        self.items = items
+
+    def match_name(self, name):
+        name = name.lower()
+        names = self.names
+        if len(name) < 3:
+            return [i for i, item_name in enumerate(names) if name in item_name]
+        postings = []
+        for gram in trigrams(name):
+            posting = self.postings.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:MAX_TRIGRAM_PROBES]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        return [i for i in sorted(candidates) if name in names[i]]
+
+    def match_price(self, min_price=None, max_price=None):
+        lo = 0 if min_price is None else bisect_left(self.sorted_prices, min_price)
+        hi = len(self.sorted_prices) if max_price is None else bisect_right(self.sorted_prices, max_price)
+        return sorted(self.price_order[lo:hi])
+
+    def search(self, name=None, min_price=None, max_price=None):
+        if name:
+            ids = self.match_name(name)
+            if min_price is not None or max_price is not None:
+                ids = self.refine(ids, min_price=min_price, max_price=max_price)
+            return ids
+        if min_price is None and max_price is None:
+            return list(range(len(self.items)))
+        return self.match_price(min_price, max_price)
+
+    def refine(self, ids, name=None, min_price=None, max_price=None):
+        # Filter an earlier result instead of querying the whole index
+        names, prices = self.names, self.prices
+        if name:
+            name = name.lower()
+            ids = [i for i in ids if name in names[i]]
+        if min_price is not None:
+            ids = [i for i in ids if prices[i] >= min_price]
+        if max_price is not None:
+            ids = [i for i in ids if prices[i] <= max_price]
+        return ids
+
+    def search_items(self, name=None, min_price=None, max_price=None):
+        items = self.items
+        return [items[i] for i in self.search(name, min_price, max_price)]
@@ -0,0 +1,353 @@
+import codecs
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from collections.abc import Mapping, Sequence
+
+from instrument import timed
+from thumbnail_cache import CACHE_DIR
+
+READ_CHUNK = 1 << 20
+CACHE_MAGIC = b'SALESTR2'
+# magic, source size, source mtime_ns, record count, id kind ('q' ints or 's' strings)
+_HEADER = struct.Struct('<8sQqQc7x')
+_SECTION = struct.Struct('<Q')
+_WHITESPACE = ' \t\r\n'
+_VALUE_END = _WHITESPACE + ',]'
+
+
+class StaleSourceError(Exception):
+    # The listing file changed since the store was built, so byte offsets
+    # into it no longer point at the indexed records
+    pass
+
+
+def parse_price(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def iter_json_records(path):
+    # Yields (byte offset, byte length, record) from a JSON array or JSON Lines
+    # file without holding more than one read chunk of text at a time
+    with open(path, 'rb') as f:
+        start = f.read(3)
+        skip = 3 if start == codecs.BOM_UTF8 else 0
+        # The format is decided by the first non-whitespace byte, however
+        # much whitespace comes before it
+        f.seek(skip)
+        first = b''
+        while not first:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                break
+            first = chunk.lstrip()[:1]
+        f.seek(skip)
+        if first == b'[':
+            yield from _iter_array(f, skip)
+        else:
+            yield from _iter_lines(f, skip)
+
+
+def _iter_lines(f, offset):
+    for line in f:
+        if line.strip():
+            yield offset, len(line), json.loads(line)
+        offset += len(line)
+
+
+def _iter_array(f, offset):
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    pos = 0
+    byte_pos = offset  # file offset of buf[pos]
+    eof = False
+    started = False
+    while True:
+        # Skip the opening bracket, separators and whitespace
+        while pos < len(buf) and (buf[pos] in _WHITESPACE or buf[pos] == ',' or (buf[pos] == '[' and not started)):
+            started = started or buf[pos] == '['
+            pos += 1
+            byte_pos += 1
+        if pos < len(buf) and buf[pos] == ']':
+            return
+        if pos < len(buf):
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # A value cut off by the chunk may still decode (1234567 as
+                # 123456, or 0.25 as 0 from '0.'), so it only counts once a
+                # separator follows it or the file has ended
+                if eof or (end < len(buf) and buf[end] in _VALUE_END):
+                    length = len(buf[pos:end].encode('utf-8'))
+                    yield byte_pos, length, record
+                    byte_pos += length
+                    pos = end
+                    continue
+        elif eof:
+            raise ValueError('unterminated JSON array')
+        chunk = f.read(READ_CHUNK)
+        eof = not chunk
+        buf = buf[pos:] + text.decode(chunk, final=eof)
+        pos = 0
+
+
+class SaleItem(Mapping):
+    # Dict-like view of one listing; fields beyond the columns load lazily
+    __slots__ = ('store', 'index', '_record')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+        self._record = None
+
+    def _full(self):
+        if self._record is None:
+            self._record = self.store.record(self.index)
+        return self._record
+
+    def __getitem__(self, key):
+        store, i = self.store, self.index
+        if key == 'id':
+            return store.ids[i]
+        if key == 'name':
+            return store.names[i]
+        if key == 'price' and store.price_texts[i]:
+            # The price as written in the file; store.prices holds it parsed
+            return store.price_texts[i]
+        if key == 'image' and store.images[i]:
+            return store.images[i]
+        return self._full()[key]
+
+    def __iter__(self):
+        return iter(self._full())
+
+    def __len__(self):
+        return len(self._full())
+
+    def __eq__(self, other):
+        if isinstance(other, SaleItem):
+            return self.store is other.store and self.index == other.index
+        return Mapping.__eq__(self, other)
+
+    def __hash__(self):
+        return hash((id(self.store), self.index))
+
+
+class SaleStore(Sequence):
+    # Columnar listings: id/price/offset arrays, interned names and image
+    # names, image names and price texts, and descriptions read back from
+    # the source file on demand
+    def __init__(self, path, ids, names, prices, images, offsets, lengths, mapped=None, source_stat=None,
+                 price_texts=None):
+        self.path = path
+        self.source_stat = source_stat  # (size, mtime_ns) of the file the offsets index
+        self.ids = ids
+        self.names = names
+        self.prices = prices
+        self.price_texts = price_texts if price_texts is not None else [''] * len(names)
+        self.images = images
+        self.offsets = offsets
+        self.lengths = lengths
+        self._mapped = mapped
+        self._source = None
+        self._source_lock = threading.Lock()  # record() seeks a shared handle
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [SaleItem(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('sale item index out of range')
+        return SaleItem(self, index)
+
+    def record(self, index):
+        with self._source_lock:
+            if self._source is None:
+                self._source = open(self.path, 'rb')
+            # Checked on the open handle: a file replaced after we opened it is
+            # still read from the old copy, an in-place edit is refused
+            st = os.fstat(self._source.fileno())
+            if self.source_stat is not None and (st.st_size, st.st_mtime_ns) != self.source_stat:
+                raise StaleSourceError(f'{self.path} changed since it was loaded')
+            self._source.seek(self.offsets[index])
+            data = self._source.read(self.lengths[index])
+        return json.loads(data)
+
+    def close(self):
+        with self._source_lock:
+            if self._source is not None:
+                self._source.close()
+                self._source = None
+        if self._mapped is not None:
+            for column in (self.ids, self.prices, self.offsets, self.lengths):
+                if isinstance(column, memoryview):
+                    column.release()
+            self._mapped.close()
+            self._mapped = None
+
+
+@timed('sale_items.parse')
+def build_store(path):
+    st = os.stat(path)
+    ids = array('q')
+    str_ids = None
+    names, images, price_texts = [], [], []
+    prices, offsets, lengths = array('d'), array('Q'), array('I')
+    for offset, length, record in iter_json_records(path):
+        item_id = record.get('id')
+        if str_ids is None and isinstance(item_id, int) and not isinstance(item_id, bool):
+            ids.append(item_id)
+        else:
+            if str_ids is None:
+                str_ids = list(ids)
+            str_ids.append(item_id)
+        names.append(sys.intern(str(record.get('name', ''))))
+        images.append(sys.intern(str(record.get('image') or '')))
+        price = record.get('price')
+        prices.append(parse_price(price))
+        price_texts.append(sys.intern(str(price)) if 'price' in record else '')
+        offsets.append(offset)
+        lengths.append(length)
+    return SaleStore(path, ids if str_ids is None else str_ids, names, prices, images, offsets, lengths,
+                     source_stat=(st.st_size, st.st_mtime_ns), price_texts=price_texts)
+
+
+def cache_path_for(path):
+    digest = hashlib.blake2b(os.path.abspath(path).encode('utf-8', 'surrogatepass'), digest_size=8).hexdigest()
+    return os.path.join(CACHE_DIR, f'sale_items-{digest}.bin')
+
+
+def _blob(strings):
+    return '\0'.join(strings).encode('utf-8', 'surrogatepass')
+
+
+def save_cache(store, cache_path):
+    if isinstance(store.ids, array):
+        id_kind, id_bytes = b'q', store.ids.tobytes()
+    elif all(isinstance(i, str) for i in store.ids):
+        id_kind, id_bytes = b's', _blob(store.ids)
+    else:
+        return False
+    if any('\0' in s for column in (store.names, store.images, store.price_texts) for s in column):
+        return False
+    # Stamped with the stat taken before parsing: a file rewritten while it
+    # was being read is not cached, so a later load re-parses it
+    if store.source_stat is None:
+        return False
+    st = os.stat(store.path)
+    if (st.st_size, st.st_mtime_ns) != store.source_stat:
+        return False
+    size, mtime_ns = store.source_stat
+    sections = [id_bytes, store.prices.tobytes(), store.offsets.tobytes(), store.lengths.tobytes(),
+                _blob(store.names), _blob(store.images), _blob(store.price_texts)]
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(CACHE_MAGIC, size, mtime_ns, len(store), id_kind))
+        for data in sections:
+            f.write(_SECTION.pack(len(data)))
+            f.write(data)
+            f.write(b'\0' * (-len(data) % 8))
+    os.replace(tmp_path, cache_path)
+    return True
+
+
+@timed('sale_items.load_cache')
+def load_cache(path, cache_path):
+    try:
+        st = os.stat(path)
+        with open(cache_path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    magic, size, mtime_ns, count, id_kind = _HEADER.unpack_from(mm, 0)
+    if magic != CACHE_MAGIC or size != st.st_size or mtime_ns != st.st_mtime_ns:
+        mm.close()
+        return None
+    view = memoryview(mm)
+    pos = _HEADER.size
+    sections = []
+    for _ in range(7):
+        (length,) = _SECTION.unpack_from(mm, pos)
+        pos += _SECTION.size
+        sections.append(view[pos:pos + length])
+        pos += length + (-length % 8)
+
+    def strings(section):
+        return [sys.intern(s) for s in bytes(section).decode('utf-8', 'surrogatepass').split('\0')] if count else []
+
+    # Numeric columns stay zero-copy views into the mapped file
+    ids = sections[0].cast('q') if id_kind == b'q' else strings(sections[0])
+    store = SaleStore(path, ids, strings(sections[4]), sections[1].cast('d'), strings(sections[5]),
+                      sections[2].cast('Q'), sections[3].cast('I'), mapped=mm, source_stat=(size, mtime_ns),
+                      price_texts=strings(sections[6]))
+    return store
+
+
+def load_sale_store(path, use_cache=True):
+    cache_path = cache_path_for(path)
+    if use_cache:
+        store = load_cache(path, cache_path)
+        if store is not None:
+            return store
+    store = build_store(path)
+    if use_cache:
+        try:
+            save_cache(store, cache_path)
+        except OSError:
+            pass
+    return store
+
+
+def diff_stores(old, new):
+    # (added, removed, changed) item ids between two loads of a listing file.
+    # The raw record length stands in for the fields that are not columns.
+    def rows(store):
+        if not isinstance(store, SaleStore):
+            return {item.get('id'): item for item in store}
+        prices = [None if math.isnan(p) else p for p in store.prices]
+        return {store.ids[i]: (store.names[i], prices[i], store.images[i], store.lengths[i]) for i in range(len(store))}
+
+    old_rows, new_rows = rows(old), rows(new)
+    added = [key for key in new_rows if key not in old_rows]
+    removed = [key for key in old_rows if key not in new_rows]
+    changed = [key for key, row in new_rows.items() if key in old_rows and old_rows[key] != row]
+    return added, removed, changed
+
+
+def position_changes(old, new):
+    # (dropped, added) positions between two loads when every unchanged
+    # listing kept its position (appends, in-place edits, removals at the
+    # end); dropped are old positions that went away or changed, added the
+    # new positions to index. Edits that shift positions show up as many
+    # changes, so callers cap the size before using it over a rebuild.
+    same_count = min(len(old), len(new))
+    old_cols = (old.ids, old.names, old.images, old.lengths)
+    new_cols = (new.ids, new.names, new.images, new.lengths)
+    changed = set()
+    for old_col, new_col in zip(old_cols, new_cols):
+        changed.update(i for i in range(same_count) if old_col[i] != new_col[i])
+    old_prices, new_prices = old.prices, new.prices
+    changed.update(i for i in range(same_count)
+                   if old_prices[i] != new_prices[i] and not (math.isnan(old_prices[i]) and math.isnan(new_prices[i])))
+    changed = sorted(changed)
+    dropped = changed + list(range(same_count, len(old)))
+    added = changed + list(range(same_count, len(new)))
+    return dropped, added
@@ -1,23 +1,176 @@
+import argparse
+import csv
+import heapq
 import json
+import math
+import sys
 
-# Load items from sale_items.json
-def load_items(filename):
-    with open(filename, 'r') as f:
-        return json.load(f)
+from sale_index import SaleIndex
+from sale_store import load_sale_store
+
+SORT_KEYS = ('id', 'name', 'price')
+QUERY_KEYS = ('name', 'min_price', 'max_price', 'sort', 'desc', 'limit')
+OUTPUT_FIELDS = ('id', 'name', 'price', 'description', 'image')
+OUTPUT_BUFFER = 1 << 20
+
+# Load items from sale_items.json (JSON array or JSON Lines) into a columnar store
+def load_items(filename, use_cache=True):
+    return load_sale_store(filename, use_cache=use_cache)
 
 def search_items(items, name=None, min_price=None, max_price=None):
-    results = []
-    for item in items:
-        match = True
-        if name and name.lower() not in item['name'].lower():
-            match = False
-        if min_price is not None and float(item['price']) < min_price:
-            match = False
-        if max_price is not None and float(item['price']) > max_price:
-            match = False
-        if match:
-            results.append(item)
-    return results
+    # Accepts a prebuilt SaleIndex; a plain item list is indexed on the fly
+    index = items if isinstance(items, SaleIndex) else SaleIndex(items)
+    return index.search_items(name=name, min_price=min_price, max_price=max_price)
+
+def sort_ids(store, ids, sort=None, descending=False, limit=None):
+    # Orders result ids on the store columns; with a limit only the top
+    # `limit` are selected instead of sorting everything
+    if sort is None:
+        return ids[:limit] if limit is not None else ids
+    if sort == 'price':
+        prices = store.prices
+        sign = -1.0 if descending else 1.0
+
+        def key(i):
+            price = prices[i]
+            # Listings without a price go last either way
+            return (1, 0.0) if math.isnan(price) else (0, sign * price)
+        reverse = False
+    elif sort == 'name':
+        names = store.names
+        key = lambda i: names[i].lower()
+        reverse = descending
+    else:
+        ids_col = store.ids
+        null_rank = -1 if descending else 2
+
+        def mixed_key(i):
+            # Ids can mix ints, strings and nulls when build_store falls back
+            # to a plain list: numbers before strings, nulls last either way
+            value = ids_col[i]
+            if value is None:
+                return (null_rank, 0, '')
+            if isinstance(value, str):
+                return (1, 0, value)
+            return (0, value, '') if isinstance(value, (int, float)) else (1, 0, str(value))
+        # Integer id columns (array or mapped cache) compare as they are
+        key = mixed_key if isinstance(ids_col, list) else ids_col.__getitem__
+        reverse = descending
+    if limit is not None:
+        select = heapq.nlargest if reverse else heapq.nsmallest
+        return select(limit, ids, key=key)
+    return sorted(ids, key=key, reverse=reverse)
+
+def result_rows(store, ids, fields):
+    prices = store.prices
+    for i in ids:
+        item = store[i]
+        row = {}
+        for field in fields:
+            if field == 'price':
+                row[field] = None if math.isnan(prices[i]) else prices[i]
+            else:
+                # Fields beyond id/name/image read the record back on demand
+                row[field] = item.get(field)
+        yield row
+
+def _query_float(value, key):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f'{key} must be a number')
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{key} must be a number, not {value!r}')
+
+def check_query(query):
+    # Coerces one --queries entry to the types the matching flags take, so a
+    # bad line is reported up front instead of failing mid-batch
+    if not isinstance(query, dict):
+        raise ValueError('expected a JSON object or a plain-text name')
+    unknown = sorted(set(query) - set(QUERY_KEYS))
+    if unknown:
+        raise ValueError(f"unknown key {unknown[0]!r} (expected {', '.join(QUERY_KEYS)})")
+    checked = {}
+    if 'name' in query:
+        name = query['name']
+        if name is not None and not isinstance(name, str):
+            raise ValueError('name must be a string')
+        checked['name'] = name
+    for key in ('min_price', 'max_price'):
+        if key in query:
+            checked[key] = _query_float(query[key], key)
+    if 'sort' in query:
+        if query['sort'] is not None and query['sort'] not in SORT_KEYS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_KEYS)}, not {query['sort']!r}")
+        checked['sort'] = query['sort']
+    if 'desc' in query:
+        if query['desc'] not in (None, True, False, 0, 1):
+            raise ValueError('desc must be true or false')
+        checked['desc'] = bool(query['desc'])
+    if 'limit' in query:
+        limit = query['limit']
+        if limit is not None:
+            try:
+                if isinstance(limit, (bool, float)):
+                    raise ValueError
+                limit = int(limit)
+            except (TypeError, ValueError):
+                raise ValueError(f'limit must be an integer, not {limit!r}')
+            if limit < 0:
+                raise ValueError('limit must not be negative')
+        checked['limit'] = limit
+    return checked
+
+def read_queries(path):
+    # One query per line: a JSON object with name/min_price/max_price/sort/
+    # desc/limit keys, or plain text searched as a name. Returns the queries
+    # and (line number, message) errors; a bad line's query is None so the
+    # others keep their numbers.
+    queries = []
+    errors = []
+    f = sys.stdin if path == '-' else open(path, 'r')
+    try:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                queries.append(check_query(json.loads(line) if line.startswith('{') else {'name': line}))
+            except ValueError as e:
+                errors.append((line_number, str(e)))
+                queries.append(None)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    return queries, errors
+
+def run_queries(index, queries, out, fmt='jsonl', fields=OUTPUT_FIELDS, defaults=None):
+    # Index once, answer every query, write all rows through one buffered stream
+    store = index.items
+    defaults = defaults or {}
+    with_query = len(queries) > 1
+    columns = (['query'] if with_query else []) + list(fields)
+    writer = csv.DictWriter(out, fieldnames=columns, extrasaction='ignore') if fmt == 'csv' else None
+    if writer is not None:
+        writer.writeheader()
+    total = 0
+    for number, query in enumerate(queries):
+        if query is None:
+            continue
+        query = {**defaults, **query}
+        ids = index.search(query.get('name') or None, query.get('min_price'), query.get('max_price'))
+        ids = sort_ids(store, ids, query.get('sort'), bool(query.get('desc')), query.get('limit'))
+        for row in result_rows(store, ids, fields):
+            if with_query:
+                row['query'] = number
+            if writer is not None:
+                writer.writerow(row)
+            else:
+                out.write(json.dumps(row) + '\n')
+        total += len(ids)
+    return total
 
 def print_results(results):
     if not results:
@@ -31,16 +184,63 @@ def print_results(results):
         print(f"Image: {item.get('image', 'N/A')}")
         print('-' * 40)
 
-def main():
-    items = load_items('sale_items.json')
+def interactive(filename='sale_items.json'):
+    index = SaleIndex(load_items(filename))
     print('Search items for sale:')
     name = input('Search by name (leave blank to skip): ').strip() or None
     min_price = input('Minimum price (leave blank to skip): ').strip()
     max_price = input('Maximum price (leave blank to skip): ').strip()
     min_price = float(min_price) if min_price else None
     max_price = float(max_price) if max_price else None
-    results = search_items(items, name=name, min_price=min_price, max_price=max_price)
+    results = search_items(index, name=name, min_price=min_price, max_price=max_price)
     print_results(results)
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Search sale items. Without arguments, asks interactively.')
+    parser.add_argument('--file', default='sale_items.json', help='sale items JSON array or JSON Lines file')
+    parser.add_argument('--name', help='substring of the listing name')
+    parser.add_argument('--min-price', type=float)
+    parser.add_argument('--max-price', type=float)
+    parser.add_argument('--sort', choices=SORT_KEYS, help='order results (default: file order)')
+    parser.add_argument('--desc', action='store_true', help='sort descending')
+    parser.add_argument('--limit', type=int, help='at most this many results per query')
+    parser.add_argument('--queries', help="file of queries, one per line ('-' for stdin); "
+                                          "--sort/--desc/--limit apply to each unless it sets its own")
+    parser.add_argument('--format', choices=('jsonl', 'csv'), default='jsonl')
+    parser.add_argument('--fields', default=','.join(OUTPUT_FIELDS),
+                        help='comma-separated output fields (default: %(default)s)')
+    parser.add_argument('--output', '-o', help='write results here instead of stdout')
+    parser.add_argument('--no-cache', action='store_true', help='parse the file without the column cache')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        interactive()
+        return
+    args = parse_args(argv)
+    fields = [f.strip() for f in args.fields.split(',') if f.strip()]
+    defaults = {'sort': args.sort, 'desc': args.desc, 'limit': args.limit}
+    errors = []
+    if args.queries:
+        queries, errors = read_queries(args.queries)
+        for line_number, message in errors:
+            print(f'{args.queries}:{line_number}: {message}', file=sys.stderr)
+    else:
+        queries = [{'name': args.name, 'min_price': args.min_price, 'max_price': args.max_price}]
+    store = load_items(args.file, use_cache=not args.no_cache)
+    index = SaleIndex(store)
+    out = open(args.output, 'w', newline='', buffering=OUTPUT_BUFFER) if args.output else sys.stdout
+    try:
+        total = run_queries(index, queries, out, args.format, fields, defaults)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        store.close()
+    print(f'{total} results for {len(queries) - len(errors)} queries', file=sys.stderr)
+    if errors:
+        print(f'{len(errors)} queries skipped', file=sys.stderr)
+        sys.exit(1)
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,161 @@
+import argparse
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from sale_store import iter_json_records
+
+SELLER_EXTENSIONS = ('.json', '.jsonl', '.csv', '.txt')
+RECORD_FIELDS = ('path', 'rel_path', 'image', 'id', 'figure_id', 'name')
+
+_worker_keys = None
+
+
+def normalize_key(text):
+    return str(text).strip().strip('"\'').replace('\\', '/').lower()
+
+
+def build_keys(image_paths, figure_meta, base_dir, wanted=None):
+    # Every way a seller might refer to a figure -> the rel_paths it means.
+    # With `wanted` (a set of rel_paths) only keys for those figures are kept.
+    keys = {}
+
+    def add(key, rel_path):
+        if key:
+            rels = keys.setdefault(normalize_key(key), [])
+            if rel_path not in rels:
+                rels.append(rel_path)
+
+    for path in image_paths:
+        rel_path = os.path.relpath(path, base_dir).replace('\\', '/')
+        if wanted is not None and rel_path not in wanted:
+            continue
+        add(path, rel_path)
+        add(rel_path, rel_path)
+        add(os.path.basename(rel_path), rel_path)
+        meta = figure_meta.get(rel_path)
+        if meta:
+            add(meta.get('id'), rel_path)
+            add(meta.get('name'), rel_path)
+    return keys
+
+
+def iter_seller_entries(seller_file):
+    # Streams the raw keys out of a seller list of any supported format
+    if seller_file.lower().endswith(('.json', '.jsonl')):
+        for _, _, record in iter_json_records(seller_file):
+            if isinstance(record, dict):
+                for field in RECORD_FIELDS:
+                    if record.get(field) is not None:
+                        yield record[field]
+            else:
+                yield record
+    else:
+        with open(seller_file, 'r', newline='') as f:
+            for row in csv.reader(f):
+                yield from row
+
+
+def match_file(seller_file, keys):
+    matched = set()
+    entries = 0
+    for entry in iter_seller_entries(seller_file):
+        entries += 1
+        key = normalize_key(entry)
+        rels = keys.get(key) or keys.get(key.rsplit('/', 1)[-1])
+        if rels:
+            matched.update(rels)
+    return matched, entries
+
+
+def _init_worker(keys):
+    global _worker_keys
+    _worker_keys = keys
+
+
+def _match_worker(seller_file):
+    try:
+        matched, entries = match_file(seller_file, _worker_keys)
+        return seller_file, sorted(matched), entries, None
+    except Exception as e:
+        return seller_file, [], 0, str(e)
+
+
+def _match_worker_local(seller_file, keys):
+    _init_worker(keys)
+    return _match_worker(seller_file)
+
+
+def seller_files(folder):
+    return sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.lower().endswith(SELLER_EXTENSIONS)
+    )
+
+
+def compare_sellers(files, keys, want_count, workers=None):
+    # Ranked report, best coverage of the wants first
+    report = []
+    if len(files) == 1:
+        results = [_match_worker_local(files[0], keys)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(keys,)) as executor:
+            results = list(executor.map(_match_worker, files, chunksize=1))
+    for seller_file, matched, entries, error in results:
+        report.append({
+            'seller': os.path.splitext(os.path.basename(seller_file))[0],
+            'file': seller_file,
+            'matches': matched,
+            'coverage': len(matched) / want_count if want_count else 0.0,
+            'entries': entries,
+            'error': error,
+        })
+    report.sort(key=lambda r: (-len(r['matches']), r['seller']))
+    return report
+
+
+def format_report(report, limit=None):
+    lines = []
+    for rank, row in enumerate(report[:limit], 1):
+        if row['error']:
+            lines.append(f"{rank}. {row['seller']}: failed ({row['error']})")
+        else:
+            lines.append(f"{rank}. {row['seller']}: {len(row['matches'])} wanted ({row['coverage']:.0%}) of {row['entries']} listed")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    from main import BASE_DIR, YEAR_FOLDERS, IMAGE_EXTENSIONS
+    from catalog_scan import scan_catalog
+    from category_store import read_categories
+
+    parser = argparse.ArgumentParser(description='Rank seller lists by how many of your wants they cover.')
+    parser.add_argument('sellers', nargs='+', help='seller list files or folders of them')
+    parser.add_argument('--user', required=True)
+    parser.add_argument('--base-dir', default=BASE_DIR)
+    parser.add_argument('--figures', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'figures.json'))
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.figures, 'r') as f:
+            figure_meta = json.load(f)
+    except Exception:
+        figure_meta = {}
+    wants = {os.path.relpath(p, args.base_dir).replace('\\', '/') for p in read_categories(args.user)['want']}
+    image_paths = scan_catalog(args.base_dir, YEAR_FOLDERS, IMAGE_EXTENSIONS)
+    keys = build_keys(image_paths, figure_meta, args.base_dir, wanted=wants)
+    files = []
+    for target in args.sellers:
+        files.extend(seller_files(target) if os.path.isdir(target) else [target])
+    report = compare_sellers(files, keys, len(wants), workers=args.workers)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report))
+
+
+if __name__ == '__main__':
+    main()
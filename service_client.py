@@ -0,0 +1,192 @@
+import http.client
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from urllib.parse import quote, urlencode, urlsplit
+
+from category_store import CATEGORY_NAMES, FLUSH_DELAY_MS, apply_record
+from thumbnail_cache import THUMB_SIZE
+
+# Client side of catalog_service: the GUIs talk to a running service instead
+# of loading the catalog and listings themselves when GIJOE_SERVER (or
+# --server) names one
+SERVER_ENV = 'GIJOE_SERVER'
+DEFAULT_URL = 'http://127.0.0.1:8765'
+TIMEOUT = 30
+PAGE_SIZE = 500
+PAGE_CACHE = 64  # result pages kept per RemoteResults
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f'{status}: {message}')
+        self.status = status
+
+
+def server_url(url=None):
+    return url or os.environ.get(SERVER_ENV) or None
+
+
+class ServiceClient:
+    # One keep-alive connection per thread, so prefetch workers can fetch
+    # thumbnails while the Tk thread runs queries
+    def __init__(self, url=DEFAULT_URL, timeout=TIMEOUT):
+        parts = urlsplit(url if '//' in url else f'http://{url}')
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.local = threading.local()
+        self.info = self.request('GET', '/health')
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def request(self, method, path, params=None, body=None, raw=False):
+        if params:
+            path += '?' + urlencode({k: v for k, v in params.items() if v is not None})
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if data is not None else {}
+        for attempt in (0, 1):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                resp = conn.getresponse()
+                payload = resp.read()
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # Stale keep-alive connection (service restarted): retry once on a fresh one
+                conn.close()
+                self.local.conn = None
+                if attempt:
+                    raise
+        if resp.status != 200:
+            try:
+                message = json.loads(payload)['error']
+            except Exception:
+                message = resp.reason
+            raise ServiceError(resp.status, message)
+        return payload if raw else json.loads(payload)
+
+    def catalog_paths(self, sort=None):
+        return self.request('GET', '/catalog', {'sort': ','.join(sort) if sort else None})['paths']
+
+    def figures(self):
+        return self.request('GET', '/figures')
+
+    def facet_values(self):
+        return self.request('GET', '/facets')
+
+    def facet_paths(self, user=None, sort=None, **query):
+        return self.request('POST', '/facets', body={'user': user, 'sort': sort, **query})['paths']
+
+    def categories(self, username):
+        return self.request('GET', f'/users/{quote(username, safe="")}/categories')
+
+    def assign(self, username, records):
+        return self.request('POST', f'/users/{quote(username, safe="")}/categories', body={'records': records})
+
+    def sale_search(self, name=None, min_price=None, max_price=None, sort=None, descending=False):
+        return RemoteResults(self, {'name': name, 'min_price': min_price, 'max_price': max_price,
+                                    'sort': sort, 'desc': 1 if descending else None})
+
+    def sale_page(self, params, offset, limit=PAGE_SIZE):
+        return self.request('GET', '/sale/search', {**params, 'offset': offset, 'limit': limit})
+
+    def sale_item(self, index):
+        return self.request('GET', f'/sale/item/{index}')
+
+    def thumbnail(self, path, size=THUMB_SIZE):
+        from PIL import Image
+        data = self.request('GET', '/thumbnail', {'path': path, 'width': size[0], 'height': size[1]}, raw=True)
+        img = Image.open(io.BytesIO(data))
+        img.load()
+        return img
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+
+class RemoteResults(Sequence):
+    # Search result that fetches rows a page at a time as they are indexed,
+    # so a VirtualList over a million matches only pulls the visible pages
+    def __init__(self, client, params):
+        self.client = client
+        self.params = params
+        self.pages = OrderedDict()
+        first = client.sale_page(params, 0)
+        self.total = first['total']
+        self.pages[0] = first['items']
+
+    def __len__(self):
+        return self.total
+
+    def _page(self, number):
+        page = self.pages.get(number)
+        if page is None:
+            page = self.client.sale_page(self.params, number * PAGE_SIZE)['items']
+            self.pages[number] = page
+            while len(self.pages) > PAGE_CACHE:
+                self.pages.popitem(last=False)
+        else:
+            self.pages.move_to_end(number)
+        return page
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.total))]
+        if index < 0:
+            index += self.total
+        if not 0 <= index < self.total:
+            raise IndexError('result index out of range')
+        return self._page(index // PAGE_SIZE)[index % PAGE_SIZE]
+
+
+class RemoteCategoryStore:
+    # CategoryStore stand-in that keeps the sets locally and posts pending
+    # assignments to the service in one request per flush
+    def __init__(self, client, username, root=None):
+        self.client = client
+        self.username = username
+        self.root = root
+        self.categories = {cat: set() for cat in CATEGORY_NAMES}
+        self.pending = []
+        self.flush_id = None
+
+    def load(self):
+        remote = self.client.categories(self.username)
+        for cat in CATEGORY_NAMES:
+            self.categories[cat] = set(remote.get(cat, ()))
+        return self.categories
+
+    def assign(self, paths, category):
+        record = {'cat': category, 'paths': list(paths)}
+        apply_record(self.categories, record)
+        self.pending.append(record)
+
+    def save(self):
+        if self.root is None:
+            self.flush()
+        elif self.flush_id is None:
+            self.flush_id = self.root.after(FLUSH_DELAY_MS, self.flush)
+
+    def flush(self):
+        if self.flush_id is not None:
+            if self.root is not None:
+                self.root.after_cancel(self.flush_id)
+            self.flush_id = None
+        if not self.pending:
+            return
+        self.client.assign(self.username, self.pending)
+        self.pending = []
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,55 @@
+import tkinter as tk
+from tkinter import filedialog
+
+import instrument
+
+STATS_REFRESH_MS = 1000
+
+
+class StatsWindow(tk.Toplevel):
+    # Live view of the instrument timers and counters, plus an on-demand
+    # cProfile capture saved as a .pstats file
+    def __init__(self, master):
+        super().__init__(master)
+        self.title('Performance Stats')
+        self.geometry('720x420')
+        btn_frame = tk.Frame(self)
+        btn_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=5)
+        tk.Button(btn_frame, text='Reset', command=self.reset).pack(side=tk.LEFT, padx=5)
+        self.profile_btn = tk.Button(btn_frame, text='', command=self.toggle_profile)
+        self.profile_btn.pack(side=tk.LEFT, padx=5)
+        self.text = tk.Text(self, font=('Courier', 9), wrap='none')
+        self.text.pack(fill=tk.BOTH, expand=True)
+        self.after_id = None
+        self.protocol('WM_DELETE_WINDOW', self.close)
+        self.refresh()
+
+    def refresh(self):
+        self.text.delete('1.0', tk.END)
+        self.text.insert(tk.END, instrument.format_stats())
+        self.profile_btn.config(text='Stop Profile & Save...' if instrument.profiling() else 'Start Profile')
+        self.after_id = self.after(STATS_REFRESH_MS, self.refresh)
+
+    def reset(self):
+        instrument.reset()
+        self.refresh_now()
+
+    def toggle_profile(self):
+        if not instrument.profiling():
+            instrument.start_profile()
+        else:
+            path = filedialog.asksaveasfilename(parent=self, title='Save Profile', defaultextension='.pstats',
+                                                filetypes=[('pstats', '*.pstats')])
+            instrument.stop_profile(path or None)
+        self.refresh_now()
+
+    def refresh_now(self):
+        if self.after_id is not None:
+            self.after_cancel(self.after_id)
+        self.refresh()
+
+    def close(self):
+        if self.after_id is not None:
+            self.after_cancel(self.after_id)
+            self.after_id = None
+        self.destroy()
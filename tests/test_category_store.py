@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from category_store import JOURNAL_FILE, CategoryStore, read_categories
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def test_missing_snapshots_load_empty(tmp_path):
+    store = CategoryStore('alice', users_dir=str(tmp_path))
+    assert store.load() == {'want': set(), 'have': set(), 'dont_want': set()}
+
+
+def test_corrupt_snapshot_raises_and_is_left_alone(tmp_path):
+    want = tmp_path / 'alice' / 'want.json'
+    truncated = json.dumps([f'/img/{i}.jpg' for i in range(1000)], indent=2)[:-200]
+    write(want, truncated)
+    store = CategoryStore('alice', users_dir=str(tmp_path))
+    with pytest.raises(ValueError, match='want.json'):
+        store.load()
+    with pytest.raises(ValueError):
+        read_categories('alice', str(tmp_path))
+    assert want.read_text() == truncated
+
+
+def test_non_list_snapshot_raises(tmp_path):
+    write(tmp_path / 'alice' / 'have.json', '{"a": 1}')
+    with pytest.raises(ValueError):
+        read_categories('alice', str(tmp_path))
+
+
+def test_journal_replays_over_snapshots_and_compacts(tmp_path):
+    write(tmp_path / 'alice' / 'want.json', json.dumps(['a', 'b']))
+    store = CategoryStore('alice', users_dir=str(tmp_path))
+    store.load()
+    store.assign(['a'], 'have')
+    store.assign(['c'], 'want')
+    store.flush()
+    assert read_categories('alice', str(tmp_path)) == {'want': {'b', 'c'}, 'have': {'a'}, 'dont_want': set()}
+    store.close()
+    assert json.loads((tmp_path / 'alice' / 'want.json').read_text()) == ['b', 'c']
+    assert (tmp_path / 'alice' / JOURNAL_FILE).read_text() == ''
+
+
+def test_torn_journal_line_is_skipped(tmp_path):
+    journal = tmp_path / 'alice' / JOURNAL_FILE
+    write(journal, '{"cat": "want", "paths": ["a"]}\n{"cat": "have", "pa\n{"cat": "have", "paths": ["b"]}\n')
+    assert read_categories('alice', str(tmp_path)) == {'want': {'a'}, 'have': {'b'}, 'dont_want': set()}
+    # Loading folds the intact records into the snapshots, and later appends
+    # start on a fresh line
+    write(journal, '{"cat": "want", "paths": ["a"]}\n{"cat": "ha')
+    store = CategoryStore('alice', users_dir=str(tmp_path), owner=False)
+    store.load()
+    assert journal.read_text() == ''
+    assert json.loads((tmp_path / 'alice' / 'want.json').read_text()) == ['a']
+    write(journal, '{"cat": "ha')
+    store.assign(['c'], 'dont_want')
+    store.flush()
+    assert read_categories('alice', str(tmp_path)) == {'want': {'a'}, 'have': set(), 'dont_want': {'c'}}
+    store.close()
+
+
+def test_compaction_keeps_other_writers_records(tmp_path, monkeypatch):
+    import category_store
+    monkeypatch.setattr(category_store, 'COMPACT_EVERY', 10)
+    app = CategoryStore('alice', users_dir=str(tmp_path))
+    app.load()
+    service = CategoryStore('alice', users_dir=str(tmp_path), owner=False)
+    service.load()
+    app.assign(['a'], 'have')
+    app.flush()
+    for i in range(10):
+        service.assign([f'p{i}'], 'want')
+        service.flush()
+    # The service compacted, keeping the app's record and picking it up
+    assert (tmp_path / 'alice' / JOURNAL_FILE).read_text() == ''
+    assert json.loads((tmp_path / 'alice' / 'have.json').read_text()) == ['a']
+    assert service.categories['have'] == {'a'}
+    app.assign(['p0'], 'dont_want')
+    app.close()
+    # The app compacts from the files too, so the service's records survive
+    assert read_categories('alice', str(tmp_path)) == \
+        {'want': {f'p{i}' for i in range(1, 10)}, 'have': {'a'}, 'dont_want': {'p0'}}
+    assert (tmp_path / 'alice' / JOURNAL_FILE).read_text() == ''
+    service.close()
@@ -0,0 +1,53 @@
+import random
+
+import numpy as np
+
+from dedupe import duplicate_groups, hidden_duplicates, near_duplicate_pairs, popcount64
+
+
+def planted_hashes(rng, count, threshold):
+    hashes = []
+    for _ in range(count):
+        if hashes and rng.random() < 0.5:
+            value = rng.choice(hashes)
+            for bit in rng.sample(range(64), rng.randint(0, threshold + 2)):
+                value ^= 1 << bit
+        else:
+            value = rng.getrandbits(64)
+        hashes.append(value)
+    return hashes
+
+
+def brute_force_pairs(hashes, threshold):
+    return sorted((i, j, bin(a ^ b).count('1')) for i, a in enumerate(hashes) for j, b in enumerate(hashes)
+                  if i < j and bin(a ^ b).count('1') <= threshold)
+
+
+def test_popcount64():
+    values = [0, 1, 2 ** 64 - 1, 0x5555555555555555, 1 << 63, 123456789123456789]
+    counts = popcount64(np.array(values, dtype=np.uint64))
+    assert counts.tolist() == [bin(v).count('1') for v in values]
+
+
+def test_near_duplicate_pairs_match_brute_force():
+    rng = random.Random(11)
+    for threshold in (0, 1, 3, 6, 10):
+        hashes = planted_hashes(rng, 300, threshold)
+        expected = brute_force_pairs(hashes, threshold)
+        assert expected
+        for block in (7, 8192):
+            pairs = near_duplicate_pairs(hashes, threshold, block=block)
+            assert [tuple(p) for p in pairs.tolist()] == expected
+
+
+def test_near_duplicate_pairs_small_inputs():
+    assert near_duplicate_pairs([]).shape == (0, 3)
+    assert near_duplicate_pairs([5]).shape == (0, 3)
+    assert near_duplicate_pairs([5, 5]).tolist() == [[0, 1, 0]]
+
+
+def test_duplicate_groups_keep_the_first_path():
+    hashes = {'a': 0b1111, 'b': 0b0111, 'c': 1 << 40, 'd': 0b0011, 'e': (1 << 40) | 1}
+    groups = duplicate_groups(['c', 'a', 'b', 'd', 'e', 'missing'], hashes, threshold=1)
+    assert groups == [['c', 'e'], ['a', 'b', 'd']]
+    assert hidden_duplicates(groups) == {'e', 'b', 'd'}
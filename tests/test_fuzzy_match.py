@@ -0,0 +1,37 @@
+import random
+import string
+
+from fuzzy_match import FuzzyMatcher, listing_year, name_trigrams
+
+
+def catalog(names):
+    # Filler figures keep the named trigrams under MAX_DF_RATIO
+    rng = random.Random(0)
+    filler = [''.join(rng.choice(string.ascii_lowercase) for _ in range(8)).title() for _ in range(100)]
+    names = list(names) + filler
+    return FuzzyMatcher(names, names)
+
+
+def test_name_trigrams_and_year():
+    assert name_trigrams('Duke!') == {' du', 'duk', 'uke', 'ke '}
+    assert listing_year('Snake Eyes 1985 MOC') == 1985
+    assert listing_year('Snake Eyes v2') == 0
+
+
+def test_longest_contained_name_wins():
+    matcher = catalog(['Cobra', 'Cobra Commander', 'Cobra Trooper'])
+    best = matcher.best_matches(['Cobra Commander MOC', 'Cobra Trooper loose', 'Cobra complete'])
+    assert {i: key for i, (key, _) in best.items()} == {0: 'Cobra Commander', 1: 'Cobra Trooper', 2: 'Cobra'}
+    # Not a tie: the shorter name covers less of the listing
+    _, figures, scores = matcher.match(['Cobra Commander MOC'], top_k=2, min_score=0.1)
+    assert [matcher.keys[f] for f in figures] == ['Cobra Commander', 'Cobra']
+    assert scores[1] < 0.9 * scores[0]
+
+
+def test_scores_tolerate_typos_and_block_on_year():
+    names = ['Storm Shadow', 'Snake Eyes', 'Snake Eyes']
+    matcher = FuzzyMatcher(['a', 'b', 'c'], names, [1984, 1982, 1985])
+    assert matcher.best_matches(['Storm Shadw mint'])[0][0] == 'a'
+    assert matcher.best_matches(['Snake Eyes 1985'])[0][0] == 'c'
+    listings, figures, scores = matcher.match(['nothing alike'])
+    assert len(listings) == len(figures) == len(scores) == 0
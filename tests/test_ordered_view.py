@@ -0,0 +1,45 @@
+import random
+
+from ordered_view import CategoryViews, FenwickTree
+
+
+def check(tree, flags):
+    members = [i for i, flag in enumerate(flags) if flag]
+    assert len(tree) == len(flags)
+    assert tree.count == len(members)
+    for pos in range(len(flags) + 1):
+        assert tree.prefix(pos) == sum(flags[:pos])
+    for k, pos in enumerate(members):
+        assert tree.select(k) == pos
+
+
+def test_fenwick_tree_build_append_and_set():
+    rng = random.Random(3)
+    for n in (0, 1, 2, 7, 8, 9, 64, 100):
+        flags = [rng.random() < 0.4 for _ in range(n)]
+        tree = FenwickTree(flags)
+        check(tree, flags)
+        for _ in range(40):
+            flag = rng.random() < 0.5
+            tree.append(flag)
+            flags.append(flag)
+        check(tree, flags)
+        for _ in range(50):
+            pos, flag = rng.randrange(len(flags)), rng.random() < 0.5
+            assert tree.set(pos, flag) == (flags[pos] != flag)
+            flags[pos] = flag
+        check(tree, flags)
+
+
+def test_category_views_follow_assignments():
+    base = ['a', 'b', 'c', 'd']
+    categories = {'want': {'b', 'd'}, 'have': {'a'}, 'dont_want': set()}
+    views = CategoryViews(base, categories)
+    assert list(views['want']) == ['b', 'd'] and views['want'][1] == 'd'
+    categories['want'].discard('b')
+    categories['have'].add('b')
+    assert views.assign('b', 'have') == {'want': ('removed', 0), 'have': ('added', 1)}
+    assert list(views['have']) == ['a', 'b'] and views['have'].index('b') == 1
+    categories['want'].add('e')
+    views.extend(['e'])
+    assert list(views['want']) == ['d', 'e'] and 'e' in views['want'] and 'e' not in views['have']
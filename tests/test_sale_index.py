@@ -0,0 +1,67 @@
+import json
+import random
+
+from sale_index import SaleIndex, narrows
+from sale_store import build_store, position_changes
+
+WORDS = ['snake', 'eyes', 'cobra', 'commander', 'duke', 'storm', 'shadow', 'moc', 'loose']
+
+
+def listings(rng, count):
+    return [{'id': i, 'name': ' '.join(rng.sample(WORDS, 2)), 'price': rng.choice(['1', '2.5', '10', 'N/A', 7])}
+            for i in range(count)]
+
+
+def store_of(tmp_path, rows, name='items.json'):
+    path = tmp_path / name
+    path.write_text(json.dumps(rows))
+    return build_store(str(path))
+
+
+def index_state(index):
+    return (list(index.names), list(index.prices), {gram: list(p) for gram, p in index.postings.items()},
+            list(index.price_order), list(index.sorted_prices))
+
+
+def test_search_and_refine():
+    items = [{'name': 'Snake Eyes', 'price': '10'}, {'name': 'Cobra', 'price': '2'},
+             {'name': 'snake eyes v2', 'price': 'x'}]
+    index = SaleIndex(items)
+    assert index.search('snake') == [0, 2]
+    assert index.search('ey', max_price=5) == [2]
+    assert index.search(min_price=1) == [0, 1]
+    assert index.refine([0, 1, 2], name='eyes v', max_price=1) == [2]
+    assert narrows(('snake', None, None), ('snake e', 1.0, None))
+    assert not narrows(('snake e', None, None), ('snake', None, None))
+
+
+def test_apply_changes_matches_a_fresh_index(tmp_path):
+    rng = random.Random(7)
+    for trial in range(30):
+        old_rows = listings(rng, rng.randint(0, 60))
+        new_rows = [dict(row) for row in old_rows]
+        for row in rng.sample(new_rows, min(len(new_rows), rng.randint(0, 10))):
+            row[rng.choice(['name', 'price'])] = rng.choice([' '.join(rng.sample(WORDS, 2)), '3', 2.5])
+        if new_rows and rng.random() < 0.4:
+            del new_rows[rng.randint(0, len(new_rows)):]
+        new_rows += listings(rng, rng.randint(0, 10))
+        if new_rows and rng.random() < 0.2:
+            new_rows.append(dict(new_rows[0]))  # duplicate id
+        old = store_of(tmp_path, old_rows, f'old{trial}.json')
+        new = store_of(tmp_path, new_rows, f'new{trial}.json')
+        index = SaleIndex(old)
+        index.apply_changes(new, *position_changes(old, new))
+        assert index.items is new
+        assert index_state(index) == index_state(SaleIndex(new))
+        for query in [('snake', None, None), (None, 2.0, 5.0), ('co', None, 3.0)]:
+            assert index.search(*query) == SaleIndex(new).search(*query)
+
+
+def test_position_changes(tmp_path):
+    rows = [{'id': i, 'name': f'n{i}', 'price': '1'} for i in range(5)]
+    old = store_of(tmp_path, rows, 'old.json')
+    rows[1]['price'] = 'N/A'
+    rows[3]['name'] = 'renamed'
+    new = store_of(tmp_path, rows[:4] + [{'id': 9, 'name': 'n9'}, {'id': 10, 'name': 'n10'}], 'new.json')
+    assert position_changes(old, new) == ([1, 3, 4], [1, 3, 4, 5])
+    assert position_changes(old, old) == ([], [])
@@ -0,0 +1,74 @@
+import codecs
+import json
+import os
+
+import pytest
+
+import sale_store
+from sale_store import StaleSourceError, build_store, iter_json_records, load_cache, save_cache
+
+RECORDS = [1234567, 89, 12345678901, {'id': 1, 'name': 'Snake Eyes é', 'price': '12.5'}, 'ünïcode',
+           [1, [2, 3]], -3.5e-07, 1e+300, {'id': 'x2', 'name': 'Cobra', 'price': 7, 'description': 'a, b ] c'}, None, 0.25]
+
+
+def check_records(path, expected):
+    data = open(path, 'rb').read()
+    got = []
+    for offset, length, record in iter_json_records(str(path)):
+        assert json.loads(data[offset:offset + length]) == record
+        got.append(record)
+    assert got == expected
+
+
+@pytest.mark.parametrize('chunk', [1, 2, 3, 5, 8, 64, 1 << 20])
+def test_iter_json_records_across_chunk_boundaries(tmp_path, monkeypatch, chunk):
+    monkeypatch.setattr(sale_store, 'READ_CHUNK', chunk)
+    array_text = '  \n\t [' + ',\n '.join(json.dumps(r, ensure_ascii=False) for r in RECORDS) + ' ]\n'
+    path = tmp_path / 'items.json'
+    path.write_bytes(array_text.encode('utf-8'))
+    check_records(path, RECORDS)
+    path.write_bytes(codecs.BOM_UTF8 + array_text.encode('utf-8'))
+    check_records(path, RECORDS)
+    lines = ''.join(json.dumps(r, ensure_ascii=False) + '\n\n' for r in RECORDS)
+    path.write_bytes(('\n  ' + lines).encode('utf-8'))
+    check_records(path, RECORDS)
+
+
+def test_unterminated_array_raises(tmp_path):
+    path = tmp_path / 'items.json'
+    path.write_text('[{"id": 1}, {"id": 2}')
+    with pytest.raises(ValueError):
+        list(iter_json_records(str(path)))
+
+
+def test_store_columns_and_cache_round_trip(tmp_path):
+    rows = [{'id': 1, 'name': 'Duke', 'price': '12.50', 'description': 'd1'},
+            {'id': 2, 'name': 'Cobra', 'price': 'call', 'image': 'c.jpg'},
+            {'id': 3, 'name': 'Flint'}]
+    path = tmp_path / 'items.json'
+    path.write_text(json.dumps(rows))
+    cache_path = str(tmp_path / 'cache.bin')
+    store = build_store(str(path))
+    assert save_cache(store, cache_path)
+    cached = load_cache(str(path), cache_path)
+    for s in (store, cached):
+        assert [item['price'] for item in s[:2]] == ['12.50', 'call']
+        assert s[0]['description'] == 'd1' and s[1]['image'] == 'c.jpg' and 'price' not in s[2]
+        assert dict(s[2]) == rows[2]
+    cached.close()
+    store.close()
+
+
+def test_changed_source_is_stale(tmp_path):
+    path = tmp_path / 'items.json'
+    path.write_text(json.dumps([{'id': 1, 'name': 'a', 'description': 'x' * 50}]))
+    cache_path = str(tmp_path / 'cache.bin')
+    store = build_store(str(path))
+    path.write_text(json.dumps([{'id': 1, 'name': 'b'}]))
+    # Written from the stat taken before parsing, so the mismatch skips the cache
+    assert not save_cache(store, cache_path)
+    assert load_cache(str(path), cache_path) is None
+    with pytest.raises(StaleSourceError):
+        store[0]['description']
+    store.close()
+    os.utime(path)
@@ -0,0 +1,53 @@
+import io
+import json
+
+import pytest
+
+from sale_index import SaleIndex
+from sale_store import build_store
+from search_sale_items import check_query, read_queries, run_queries, sort_ids
+
+
+def test_check_query_coerces_like_the_flags():
+    assert check_query({'name': 'snake', 'min_price': '10', 'limit': '3', 'desc': 1}) == \
+        {'name': 'snake', 'min_price': 10.0, 'limit': 3, 'desc': True}
+    assert check_query({'max_price': '', 'sort': None}) == {'max_price': None, 'sort': None}
+
+
+@pytest.mark.parametrize('query', [{'min_price': 'ten'}, {'max_price': True}, {'limit': 2.5}, {'limit': -1},
+                                   {'sort': 'rating'}, {'desc': 'yes'}, {'name': 5}, {'nam': 'x'}, ['x']])
+def test_check_query_rejects(query):
+    with pytest.raises(ValueError):
+        check_query(query)
+
+
+def test_read_queries_reports_bad_lines(tmp_path):
+    path = tmp_path / 'queries.txt'
+    path.write_text('# nightly\n{"name": "a", "min_price": "1"}\n\n{"min_price": "x"}\n{"name": \nplain name\n')
+    queries, errors = read_queries(str(path))
+    assert queries == [{'name': 'a', 'min_price': 1.0}, None, None, {'name': 'plain name'}]
+    assert [line for line, _ in errors] == [4, 5]
+
+
+def test_run_queries_skips_bad_queries_and_keeps_numbers(tmp_path):
+    path = tmp_path / 'items.json'
+    path.write_text(json.dumps([{'id': i, 'name': f'snake {i}', 'price': str(i)} for i in range(10)]))
+    store = build_store(str(path))
+    out = io.StringIO()
+    queries = [{'name': 'snake', 'min_price': 7.0}, None, {'name': 'snake', 'sort': 'price', 'desc': True}]
+    total = run_queries(SaleIndex(store), queries, out, fields=('id',), defaults={'limit': 2})
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert total == 4
+    assert rows == [{'id': 7, 'query': 0}, {'id': 8, 'query': 0}, {'id': 9, 'query': 2}, {'id': 8, 'query': 2}]
+    store.close()
+
+
+def test_sort_ids_with_mixed_ids(tmp_path):
+    path = tmp_path / 'items.json'
+    path.write_text(json.dumps([{'id': v, 'name': 'x'} for v in [3, 'b', None, 1, 'a', 2.5]]))
+    store = build_store(str(path))
+    ids = list(range(len(store)))
+    assert [store.ids[i] for i in sort_ids(store, ids, 'id')] == [1, 2.5, 3, 'a', 'b', None]
+    assert [store.ids[i] for i in sort_ids(store, ids, 'id', descending=True)] == ['b', 'a', 3, 2.5, 1, None]
+    assert [store.ids[i] for i in sort_ids(store, ids, 'id', limit=2)] == [1, 2.5]
+    store.close()
@@ -0,0 +1,53 @@
+import itertools
+import random
+
+from trade_match import TradeMatcher
+
+
+def random_matcher(seed, users=9, figures=12, per_user=3):
+    rng = random.Random(seed)
+    matcher = TradeMatcher('/base', '/nonexistent')
+    figs = [f'f{i}' for i in range(figures)]
+    for u in range(users):
+        matcher.update_user(f'u{u}', {'have': rng.sample(figs, per_user), 'want': rng.sample(figs, per_user)})
+    return matcher
+
+
+def brute_force_cycles(matcher, max_length, username=None):
+    users = sorted(matcher.user_haves)
+    found = set()
+    for length in range(3, max_length + 1):
+        for path in itertools.permutations(users, length):
+            if username is None and path[0] != min(path):
+                continue
+            if username is not None and path[0] != username:
+                continue
+            if all(matcher.gives(a, b) for a, b in zip(path, path[1:] + path[:1])):
+                found.add(path)
+    return found
+
+
+def test_trade_cycles_match_brute_force():
+    for seed in range(20):
+        matcher = random_matcher(seed)
+        for username in (None, 'u0', 'u3'):
+            cycles = matcher.trade_cycles(username, max_length=4, limit=10 ** 6)
+            got = [tuple(c['users']) for c in cycles]
+            assert len(got) == len(set(got))
+            assert set(got) == brute_force_cycles(matcher, 4, username)
+
+
+def test_trade_cycles_without_closers_return_at_once():
+    matcher = random_matcher(0, users=400, figures=40, per_user=10)
+    matcher.update_user('aaa', {'have': ['f1', 'f2'], 'want': ['nobody has this']})
+    assert matcher.trade_cycles('aaa') == []
+
+
+def test_mutual_trades():
+    matcher = TradeMatcher('/base', '/nonexistent')
+    matcher.update_user('a', {'have': ['x'], 'want': ['y']})
+    matcher.update_user('b', {'have': ['y'], 'want': ['x']})
+    matcher.update_user('c', {'have': ['y'], 'want': []})
+    assert matcher.mutual_trades('a') == [{'users': ['a', 'b'], 'gives': ['x'], 'gets': ['y']}]
+    matcher.remove_user('b')
+    assert matcher.mutual_trades('a') == []
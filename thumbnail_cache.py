@@ -0,0 +1,240 @@
+import hashlib
+import io
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+
+from instrument import count, timed
+
+# Persistent thumbnail store: one pack file holding the encoded thumbnails and
+# an append-only index of fixed-size records that is memory-mapped on open.
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+PACK_FILE = 'thumbs.pack'
+INDEX_FILE = 'thumbs.idx'
+LOCK_FILE = 'cache.lock'
+# Sibling directories (cache.1, cache.2, ...) tried when another process holds the cache
+MAX_CACHE_DIRS = 8
+THUMB_SIZE = (550, 550)
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+# After eviction the pack is compacted down to this fraction of the cap
+COMPACT_RATIO = 0.8
+
+# key digest, pack offset, length, width, height, format code
+_RECORD = struct.Struct('<16sQIHHB3x')
+_FORMATS = {0: 'JPEG', 1: 'PNG'}
+_FORMAT_CODES = {v: k for k, v in _FORMATS.items()}
+
+
+def thumbnail_key(path, size=THUMB_SIZE):
+    st = os.stat(path)
+    raw = f'{os.path.abspath(path)}\0{st.st_mtime_ns}\0{st.st_size}\0{size[0]}x{size[1]}'
+    return hashlib.blake2b(raw.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+@timed('decode')
+def make_thumbnail(path, size=THUMB_SIZE):
+    from PIL import Image
+    img = Image.open(path)
+    if img.format == 'JPEG':
+        # Let libjpeg decode at 1/2, 1/4 or 1/8 scale instead of full size
+        img.draft('RGB', size)
+    img.thumbnail(size)
+    if img.mode not in ('RGB', 'RGBA', 'L'):
+        has_alpha = img.mode in ('LA', 'PA') or 'transparency' in img.info
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+    return img
+
+
+def try_lock(lock_path):
+    # Non-blocking exclusive lock held for as long as the file stays open
+    f = open(lock_path, 'a+b')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def claim_cache_dir(cache_dir):
+    # Pack offsets come from this process's own append handle, so a cache
+    # directory has exactly one writer. Another GUI window or the catalog
+    # service already using `cache_dir` sends us to the next free sibling,
+    # which keeps its thumbnails across restarts like the first one.
+    for i in range(MAX_CACHE_DIRS):
+        path = cache_dir if i == 0 else f'{cache_dir}.{i}'
+        os.makedirs(path, exist_ok=True)
+        lock = try_lock(os.path.join(path, LOCK_FILE))
+        if lock is not None:
+            return path, lock
+    path = tempfile.mkdtemp(prefix='gijoe-thumbs-')
+    return path, try_lock(os.path.join(path, LOCK_FILE))
+
+
+class ThumbnailCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        cache_dir, self._lock_file = claim_cache_dir(cache_dir)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.pack_path = os.path.join(cache_dir, PACK_FILE)
+        self.index_path = os.path.join(cache_dir, INDEX_FILE)
+        self.entries = OrderedDict()  # key -> (offset, length, width, height, fmt), LRU order
+        self.live_bytes = 0
+        self.lock = threading.RLock()
+        self._pack = None
+        self._index = None
+        self._map = None
+        self._load_index()
+        self._open_files()
+
+    def _load_index(self):
+        pack_size = os.path.getsize(self.pack_path) if os.path.exists(self.pack_path) else 0
+        if not os.path.exists(self.index_path) or os.path.getsize(self.index_path) < _RECORD.size:
+            return
+        with open(self.index_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # A torn trailing record from a crash is simply ignored
+                count = len(mm) // _RECORD.size
+                for i in range(count):
+                    key, offset, length, width, height, fmt = _RECORD.unpack_from(mm, i * _RECORD.size)
+                    if offset + length > pack_size or fmt not in _FORMATS:
+                        continue
+                    old = self.entries.pop(key, None)
+                    if old:
+                        self.live_bytes -= old[1]
+                    self.entries[key] = (offset, length, width, height, fmt)
+                    self.live_bytes += length
+
+    def _open_files(self):
+        self._pack = open(self.pack_path, 'ab')
+        self._index = open(self.index_path, 'ab')
+        self._map = None
+
+    def _close_files(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        for f in (self._pack, self._index):
+            if f is not None:
+                f.close()
+        self._pack = self._index = None
+
+    def _read(self, offset, length):
+        if self._map is None or offset + length > len(self._map):
+            if self._map is not None:
+                self._map.close()
+            self._pack.flush()
+            with open(self.pack_path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map[offset:offset + length]
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            offset, length, width, height, fmt = entry
+            return self._read(offset, length)
+
+    def store(self, key, img):
+        fmt = 'PNG' if img.mode == 'RGBA' else 'JPEG'
+        buf = io.BytesIO()
+        if fmt == 'JPEG':
+            img.save(buf, fmt, quality=90)
+        else:
+            img.save(buf, fmt, compress_level=1)
+        data = buf.getvalue()
+        with self.lock:
+            offset = self._pack.tell()
+            self._pack.write(data)
+            self._pack.flush()
+            entry = (offset, len(data), img.width, img.height, _FORMAT_CODES[fmt])
+            self._index.write(_RECORD.pack(key, *entry))
+            self._index.flush()
+            old = self.entries.pop(key, None)
+            if old:
+                self.live_bytes -= old[1]
+            self.entries[key] = entry
+            self.live_bytes += len(data)
+            if offset + len(data) > self.max_bytes:
+                self._evict()
+
+    def get(self, path, size=THUMB_SIZE):
+        from PIL import Image
+        key = thumbnail_key(path, size)
+        data = self.lookup(key)
+        if data is not None:
+            count('thumbs.hit')
+            img = Image.open(io.BytesIO(data))
+            img.load()
+            return img
+        count('thumbs.miss')
+        img = make_thumbnail(path, size)
+        self.store(key, img)
+        return img
+
+    def _evict(self):
+        # Drop least recently used entries, then rewrite the pack without dead space
+        target = int(self.max_bytes * COMPACT_RATIO)
+        while self.entries and self.live_bytes > target:
+            _, entry = self.entries.popitem(last=False)
+            self.live_bytes -= entry[1]
+        self.compact()
+
+    def compact(self):
+        with self.lock:
+            self._pack.flush()
+            tmp_pack = self.pack_path + '.tmp'
+            tmp_index = self.index_path + '.tmp'
+            new_entries = OrderedDict()
+            with open(self.pack_path, 'rb') as src, open(tmp_pack, 'wb') as dst, open(tmp_index, 'wb') as idx:
+                for key, (offset, length, width, height, fmt) in self.entries.items():
+                    src.seek(offset)
+                    data = src.read(length)
+                    entry = (dst.tell(), length, width, height, fmt)
+                    dst.write(data)
+                    idx.write(_RECORD.pack(key, *entry))
+                    new_entries[key] = entry
+            self._close_files()
+            os.replace(tmp_pack, self.pack_path)
+            os.replace(tmp_index, self.index_path)
+            self.entries = new_entries
+            self.live_bytes = sum(e[1] for e in new_entries.values())
+            self._open_files()
+
+    def close(self):
+        with self.lock:
+            if self._pack is None:
+                return
+            self._close_files()
+            # Rewrite the index in LRU order so eviction order survives restarts
+            tmp_index = self.index_path + '.tmp'
+            with open(tmp_index, 'wb') as idx:
+                for key, entry in self.entries.items():
+                    idx.write(_RECORD.pack(key, *entry))
+            os.replace(tmp_index, self.index_path)
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_cache():
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ThumbnailCache()
+        return _default_cache
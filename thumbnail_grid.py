@@ -0,0 +1,221 @@
+import tkinter as tk
+
+from image_prefetch import POLL_MS
+from virtual_list import SELECT_BG
+
+GRID_THUMB_SIZE = (120, 120)
+# Rows above and below the viewport that are decoded ahead of scrolling
+GRID_MARGIN_ROWS = 2
+GRID_CACHE_SIZE = 400
+CELL_PAD = 6
+LABEL_HEIGHT = 16
+
+
+class ThumbnailGrid(tk.Frame):
+    # Contact sheet over a list of image paths. Like VirtualList it only keeps
+    # canvas items and PhotoImages for the visible cells; thumbnails for the
+    # viewport plus a margin are decoded by `prefetcher` off the Tk thread.
+    # label(path) gives the caption, outline(path) the cell border colour.
+    def __init__(self, master, prefetcher, thumb_size=GRID_THUMB_SIZE, label=None, outline=None, height=None):
+        super().__init__(master)
+        self.prefetcher = prefetcher
+        self.thumb_size = thumb_size
+        self.label = label or (lambda path: '')
+        self.outline = outline or (lambda path: '')
+        self.cell_width = thumb_size[0] + 2 * CELL_PAD
+        self.cell_height = thumb_size[1] + 2 * CELL_PAD + LABEL_HEIGHT
+        self.items = []
+        self.top_row = 0
+        self.selected = set()
+        self.anchor = None
+        self.cells = []  # pooled (rect_id, image_id, text_id), one per visible slot
+        self.photos = {}  # path -> PhotoImage, visible cells only
+        self.poll_id = None
+        canvas_opts = {'bg': 'white', 'highlightthickness': 0}
+        if height:
+            canvas_opts['height'] = height * self.cell_height
+        self.canvas = tk.Canvas(self, **canvas_opts)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas.bind('<Configure>', lambda e: self.redraw())
+        self.canvas.bind('<Button-1>', lambda e: self.on_click(e, 'set'))
+        self.canvas.bind('<Control-Button-1>', lambda e: self.on_click(e, 'toggle'))
+        self.canvas.bind('<Shift-Button-1>', lambda e: self.on_click(e, 'range'))
+        self.canvas.bind('<Double-Button-1>', self.on_double_click)
+        self.canvas.bind('<Control-a>', lambda e: self.select_all())
+        self.canvas.bind('<MouseWheel>', lambda e: self.scroll(-1 if e.delta > 0 else 1, 'units'))
+        self.canvas.bind('<Button-4>', lambda e: self.scroll(-1, 'units'))
+        self.canvas.bind('<Button-5>', lambda e: self.scroll(1, 'units'))
+        self.canvas.bind('<Prior>', lambda e: self.scroll(-1, 'pages'))
+        self.canvas.bind('<Next>', lambda e: self.scroll(1, 'pages'))
+
+    def set_items(self, items, keep_position=False):
+        self.items = items
+        if not keep_position:
+            self.top_row = 0
+        self.top_row = min(self.top_row, self.max_top())
+        self.selected = set()
+        self.anchor = None
+        self.redraw()
+
+    def columns(self):
+        return max(1, self.canvas.winfo_width() // self.cell_width)
+
+    def total_rows(self):
+        return -(-len(self.items) // self.columns())
+
+    def visible_rows(self):
+        return max(1, self.canvas.winfo_height() // self.cell_height)
+
+    def max_top(self):
+        return max(0, self.total_rows() - self.visible_rows())
+
+    def yview(self, *args):
+        if not args:
+            return self.fractions()
+        if args[0] == 'moveto':
+            self.top_row = int(float(args[1]) * self.total_rows())
+        elif args[0] == 'scroll':
+            self.scroll(int(args[1]), args[2])
+            return
+        self.top_row = min(max(0, self.top_row), self.max_top())
+        self.redraw()
+
+    def scroll(self, amount, what='units'):
+        step = self.visible_rows() if what == 'pages' else 1
+        self.top_row = min(max(0, self.top_row + amount * step), self.max_top())
+        self.redraw()
+
+    def see(self, index):
+        row = index // self.columns()
+        if row < self.top_row:
+            self.top_row = row
+        elif row >= self.top_row + self.visible_rows():
+            self.top_row = row - self.visible_rows() + 1
+        self.top_row = min(max(0, self.top_row), self.max_top())
+        self.redraw()
+
+    def fractions(self):
+        total = self.total_rows()
+        if not total:
+            return 0.0, 1.0
+        return self.top_row / total, min(1.0, (self.top_row + self.visible_rows()) / total)
+
+    def visible_range(self):
+        cols = self.columns()
+        first = self.top_row * cols
+        # A partly shown last row counts as visible
+        return first, min(len(self.items), first + (self.visible_rows() + 1) * cols)
+
+    def redraw(self):
+        from PIL import ImageTk
+        first, last = self.visible_range()
+        cols = self.columns()
+        slots = (self.visible_rows() + 1) * cols
+        while len(self.cells) < slots:
+            rect = self.canvas.create_rectangle(0, 0, 0, 0, width=2, outline='', fill='')
+            image = self.canvas.create_image(0, 0, anchor='center')
+            text = self.canvas.create_text(0, 0, anchor='n', text='', font=('Arial', 8))
+            self.cells.append((rect, image, text))
+        photos = {}
+        missing = False
+        for slot, (rect, image, text) in enumerate(self.cells):
+            index = first + slot
+            if slot >= slots or index >= last:
+                self.canvas.itemconfigure(rect, outline='', fill='')
+                self.canvas.itemconfigure(image, image='')
+                self.canvas.itemconfigure(text, text='')
+                continue
+            path = self.items[index]
+            x = (slot % cols) * self.cell_width
+            y = (slot // cols) * self.cell_height
+            self.canvas.coords(rect, x + 2, y + 2, x + self.cell_width - 2, y + self.cell_height - 2)
+            self.canvas.itemconfigure(rect, outline=self.outline(path), fill=SELECT_BG if index in self.selected else '')
+            photo = self.photos.get(path)
+            if photo is None:
+                img = self.prefetcher.get(path)
+                if img is not None:
+                    photo = ImageTk.PhotoImage(img)
+                elif not self.prefetcher.failed(path):
+                    missing = True
+            if photo is not None:
+                photos[path] = photo
+            self.canvas.coords(image, x + self.cell_width // 2, y + CELL_PAD + self.thumb_size[1] // 2)
+            self.canvas.itemconfigure(image, image=photo if photo is not None else '')
+            self.canvas.coords(text, x + self.cell_width // 2, y + CELL_PAD + self.thumb_size[1] + 2)
+            self.canvas.itemconfigure(text, text=self.label(path), fill='white' if index in self.selected else 'black')
+        # Off-screen PhotoImages are dropped; the decoded images stay in the prefetcher's LRU
+        self.photos = photos
+        self.scrollbar.set(*self.fractions())
+        self.request_thumbnails()
+        if missing and self.poll_id is None:
+            self.poll_id = self.after(POLL_MS, self._poll)
+
+    def request_thumbnails(self):
+        # Viewport first, then the margin rows below and above it
+        first, last = self.visible_range()
+        margin = GRID_MARGIN_ROWS * self.columns()
+        order = list(range(first, last))
+        order += list(range(last, min(len(self.items), last + margin)))
+        order += list(range(first - 1, max(0, first - margin) - 1, -1))
+        self.prefetcher.fetch([self.items[i] for i in order])
+
+    def _poll(self):
+        self.poll_id = None
+        first, last = self.visible_range()
+        if any(self.items[i] not in self.photos and self.prefetcher.get(self.items[i]) is not None
+               for i in range(first, last)):
+            self.redraw()
+        elif any(self.items[i] not in self.photos and not self.prefetcher.failed(self.items[i])
+                 for i in range(first, last)):
+            self.poll_id = self.after(POLL_MS, self._poll)
+
+    def index_at(self, x, y):
+        col = x // self.cell_width
+        if col >= self.columns():
+            return None
+        index = (self.top_row + y // self.cell_height) * self.columns() + col
+        return index if index < len(self.items) else None
+
+    def on_click(self, event, mode):
+        self.canvas.focus_set()
+        index = self.index_at(event.x, event.y)
+        if index is None:
+            return
+        if mode == 'toggle':
+            self.selected.symmetric_difference_update({index})
+            self.anchor = index
+        elif mode == 'range' and self.anchor is not None:
+            lo, hi = sorted((self.anchor, index))
+            self.selected = set(range(lo, hi + 1))
+        else:
+            self.selected = {index}
+            self.anchor = index
+        self.redraw()
+        self.event_generate('<<GridSelect>>')
+
+    def on_double_click(self, event):
+        index = self.index_at(event.x, event.y)
+        if index is not None:
+            self.selected = {index}
+            self.anchor = index
+            self.redraw()
+            self.event_generate('<<GridActivate>>')
+
+    def select_all(self):
+        self.selected = set(range(len(self.items)))
+        self.redraw()
+        self.event_generate('<<GridSelect>>')
+
+    def curselection(self):
+        return tuple(sorted(self.selected))
+
+    def selected_paths(self):
+        return [self.items[i] for i in sorted(self.selected)]
+
+    def destroy(self):
+        if self.poll_id is not None:
+            self.after_cancel(self.poll_id)
+            self.poll_id = None
+        super().destroy()
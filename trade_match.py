@@ -0,0 +1,244 @@
+import argparse
+import json
+import os
+from collections import defaultdict
+
+from category_store import CATEGORY_NAMES, JOURNAL_FILE, USERS_DIR, read_categories
+
+MAX_CYCLE_LENGTH = 4
+
+
+def figure_key(path, base_dir):
+    # Users on different machines store absolute paths under their own base
+    # folder; the part from the year folder on is what identifies a figure
+    rel_path = path.replace('\\', '/')
+    base = base_dir.replace('\\', '/').rstrip('/') + '/'
+    if rel_path.lower().startswith(base.lower()):
+        return rel_path[len(base):]
+    parts = rel_path.rsplit('/', 2)
+    return '/'.join(parts[-2:])
+
+
+class TradeMatcher:
+    # Inverted index figure -> users having / wanting it, across users/*
+    def __init__(self, base_dir, users_dir=USERS_DIR):
+        self.base_dir = base_dir
+        self.users_dir = users_dir
+        self.haves = defaultdict(set)  # figure -> users who have it
+        self.wants = defaultdict(set)  # figure -> users who want it
+        self.user_haves = {}
+        self.user_wants = {}
+        self.stamps = {}  # user -> file mtimes at last load
+
+    def _stamp(self, username):
+        user_dir = os.path.join(self.users_dir, username)
+        stamp = []
+        for name in [f'{cat}.json' for cat in CATEGORY_NAMES] + [JOURNAL_FILE]:
+            try:
+                st = os.stat(os.path.join(user_dir, name))
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def usernames(self):
+        try:
+            return sorted(name for name in os.listdir(self.users_dir)
+                          if os.path.isdir(os.path.join(self.users_dir, name)))
+        except FileNotFoundError:
+            return []
+
+    def refresh(self):
+        # Reload only users whose category files changed; returns changed users
+        present = set(self.usernames())
+        changed = []
+        for username in list(self.stamps):
+            if username not in present:
+                self.remove_user(username)
+                changed.append(username)
+        for username in sorted(present):
+            stamp = self._stamp(username)
+            if self.stamps.get(username) != stamp:
+                # Read-only: these are other users' files, possibly mid-write
+                try:
+                    categories = read_categories(username, self.users_dir)
+                except ValueError:
+                    # A broken snapshot: keep what we had and retry next refresh
+                    continue
+                self.update_user(username, categories)
+                self.stamps[username] = stamp
+                changed.append(username)
+        return changed
+
+    def update_user(self, username, categories):
+        new_haves = {figure_key(p, self.base_dir) for p in categories.get('have', ())}
+        new_wants = {figure_key(p, self.base_dir) for p in categories.get('want', ())}
+        old_haves = self.user_haves.get(username, set())
+        old_wants = self.user_wants.get(username, set())
+        # Touch only the postings that differ
+        for figure in old_haves - new_haves:
+            self._discard(self.haves, figure, username)
+        for figure in new_haves - old_haves:
+            self.haves[figure].add(username)
+        for figure in old_wants - new_wants:
+            self._discard(self.wants, figure, username)
+        for figure in new_wants - old_wants:
+            self.wants[figure].add(username)
+        self.user_haves[username] = new_haves
+        self.user_wants[username] = new_wants
+
+    def remove_user(self, username):
+        self.update_user(username, {})
+        self.user_haves.pop(username, None)
+        self.user_wants.pop(username, None)
+        self.stamps.pop(username, None)
+
+    @staticmethod
+    def _discard(index, figure, username):
+        users = index.get(figure)
+        if users is not None:
+            users.discard(username)
+            if not users:
+                del index[figure]
+
+    def receivers(self, giver, memo=None):
+        # receiver -> figures `giver` has that they want, read off the postings
+        if memo is not None and giver in memo:
+            return memo[giver]
+        out = defaultdict(set)
+        for figure in self.user_haves.get(giver, ()):
+            for receiver in self.wants.get(figure, ()):
+                if receiver != giver:
+                    out[receiver].add(figure)
+        if memo is not None:
+            memo[giver] = out
+        return out
+
+    def givers(self, receiver):
+        # giver -> figures they have that `receiver` wants
+        out = defaultdict(set)
+        for figure in self.user_wants.get(receiver, ()):
+            for giver in self.haves.get(figure, ()):
+                if giver != receiver:
+                    out[giver].add(figure)
+        return out
+
+    def giver_set(self, receiver, memo=None):
+        # Just the users from givers(), without the figures
+        if memo is not None and receiver in memo:
+            return memo[receiver]
+        users = set().union(*(self.haves.get(figure, ()) for figure in self.user_wants.get(receiver, ())))
+        users.discard(receiver)
+        if memo is not None:
+            memo[receiver] = users
+        return users
+
+    def hops_to(self, target, max_hops, memo=None, floor=None):
+        # user -> fewest gives it takes to get something to `target` (at most
+        # max_hops), found walking the givers back from `target`. With a floor
+        # only users named above it are walked.
+        hops = {target: 0}
+        frontier = [target]
+        for depth in range(1, max_hops + 1):
+            next_frontier = []
+            for node in frontier:
+                for giver in self.giver_set(node, memo):
+                    if giver not in hops and (floor is None or giver > floor):
+                        hops[giver] = depth
+                        next_frontier.append(giver)
+            frontier = next_frontier
+        return hops
+
+    def gives(self, giver, receiver):
+        return self.user_haves.get(giver, set()) & self.user_wants.get(receiver, set())
+
+    def mutual_trades(self, username=None):
+        users = [username] if username is not None else sorted(self.user_haves)
+        trades = []
+        for a in users:
+            receivers = self.receivers(a)
+            for b, gets in self.givers(a).items():
+                if username is None and b < a:
+                    continue
+                gives = receivers.get(b)
+                if gives:
+                    trades.append({'users': [a, b], 'gives': sorted(gives), 'gets': sorted(gets)})
+        trades.sort(key=lambda t: -min(len(t['gives']), len(t['gets'])))
+        return trades
+
+    def trade_cycles(self, username=None, max_length=MAX_CYCLE_LENGTH, limit=100):
+        # Simple cycles of 3..max_length users where each gives the next
+        # something they want. Without a user each cycle is reported once,
+        # rooted at its smallest user name.
+        memo, giver_memo = {}, {}
+        starts = [username] if username is not None else sorted(self.user_haves)
+        cycles = []
+        for start in starts:
+            if len(cycles) >= limit:
+                break
+            closers = self.giver_set(start, giver_memo)  # users who can hand `start` something
+            if not closers:
+                continue
+            # Only users who can pass something back round to `start` in the
+            # hops a path has left are worth extending it with
+            hops = self.hops_to(start, max_length - 1, giver_memo, None if username is not None else start)
+            stack = [[start]]
+            while stack and len(cycles) < limit:
+                path = stack.pop()
+                node = path[-1]
+                if len(path) >= 3 and node in closers:
+                    cycles.append(self._describe_cycle(path))
+                if len(path) == max_length:
+                    continue
+                hops_left = max_length - len(path)
+                for nxt in self.receivers(node, memo):
+                    if nxt in path or (username is None and nxt < start):
+                        continue
+                    if hops.get(nxt, max_length) > hops_left:
+                        continue
+                    stack.append(path + [nxt])
+        return cycles[:limit]
+
+    def _describe_cycle(self, path):
+        steps = []
+        for giver, receiver in zip(path, path[1:] + path[:1]):
+            steps.append({'from': giver, 'to': receiver, 'figures': sorted(self.gives(giver, receiver))})
+        return {'users': path, 'steps': steps}
+
+
+def format_trades(username, trades, cycles, limit=20):
+    lines = []
+    for trade in trades[:limit]:
+        a, b = trade['users']
+        if username is None:
+            lines.append(f"{a} <-> {b}: {len(trade['gives'])} for {len(trade['gets'])}")
+        else:
+            lines.append(f"Trade with {b}: give {len(trade['gives'])}, get {len(trade['gets'])}")
+    for cycle in cycles[:limit]:
+        lines.append('Cycle: ' + ' -> '.join(cycle['users'] + cycle['users'][:1]))
+    return '\n'.join(lines) if lines else 'No trades found.'
+
+
+def main(argv=None):
+    from main import BASE_DIR
+
+    parser = argparse.ArgumentParser(description='Find trades between users in the users/ folder.')
+    parser.add_argument('--user', help='only trades involving this user')
+    parser.add_argument('--base-dir', default=BASE_DIR)
+    parser.add_argument('--users-dir', default=USERS_DIR)
+    parser.add_argument('--max-cycle', type=int, default=MAX_CYCLE_LENGTH)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    matcher = TradeMatcher(args.base_dir, args.users_dir)
+    matcher.refresh()
+    trades = matcher.mutual_trades(args.user)
+    cycles = matcher.trade_cycles(args.user, max_length=args.max_cycle)
+    if args.json:
+        print(json.dumps({'mutual': trades, 'cycles': cycles}, indent=2))
+    else:
+        print(format_trades(args.user, trades, cycles))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,29 +1,143 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import json
 from PIL import Image, ImageTk
 import os
+import queue
+import threading
+from sale_index import SaleIndex, narrows
+from virtual_list import VirtualList
+from sale_store import StaleSourceError, diff_stores, load_sale_store, position_changes
+from service_client import ServiceError
+from fs_watch import TkWatch
+from instrument import timed
 
 SALE_ITEMS_FILE = 'sale_items.json'
 IMAGE_DIR = 'images'  # Match Sale Item Builder's image folder
+FILTER_DELAY_MS = 120  # Debounce for live search
+REFINE_CHUNK = 10000  # Items refined per Tk idle slice
+REFINE_LIMIT = 50000  # Above this the index answers faster than refining
+RELOAD_POLL_MS = 50
+INCREMENTAL_LIMIT = 5000  # Changed positions above which a reload reindexes from scratch
 
 class SaleItemsViewer(tk.Tk):
-    def __init__(self):
+    def __init__(self, client=None):
         super().__init__()
         self.title('Sale Items Viewer')
         self.geometry('600x400')
+        # With a catalog_service client searches run on the service and
+        # results are paged in as the list scrolls
+        self.client = client
         self.items = self.load_items()
-        self.filtered_items = self.items.copy()
+        self.index = SaleIndex(self.items) if client is None else None
+        self.filtered_items = self.items
+        self.filtered_ids = list(range(len(self.items))) if client is None else None
+        self.last_query = (None, None, None)  # query behind filtered_ids
+        self.active_query = self.last_query  # newest query, shown or still refining
+        self.filter_after_id = None
+        self.filter_generation = 0
+        self.reload_queue = queue.Queue()
+        self.reload_thread = None
+        self.reload_again = False
         self.create_widgets()
+        # Edits to sale_items.json are picked up without a restart
+        self.watch = TkWatch(self, [os.path.abspath(SALE_ITEMS_FILE)], self.reload_items) if client is None else None
+        self.protocol('WM_DELETE_WINDOW', self.on_close)
+        self.bind('<F12>', lambda e: self.open_stats_window())
 
+    @timed('load_items')
     def load_items(self):
         try:
-            with open(SALE_ITEMS_FILE, 'r') as f:
-                return json.load(f)
+            if self.client is not None:
+                return self.client.sale_search()
+            return load_sale_store(SALE_ITEMS_FILE)
         except Exception as e:
             messagebox.showerror('Error', f'Failed to load items: {e}')
             return []
 
+    def reload_items(self, changed):
+        # Parsing, diffing and any full reindex run on a worker thread; the
+        # Tk thread only applies the result
+        if self.reload_thread is not None:
+            self.reload_again = True
+            return
+        self.reload_thread = threading.Thread(target=self._reload_worker, args=(self.items,), daemon=True)
+        self.reload_thread.start()
+        self.after(RELOAD_POLL_MS, self._poll_reload)
+
+    def _reload_worker(self, old):
+        try:
+            items = load_sale_store(SALE_ITEMS_FILE)
+            diff = diff_stores(old, items)
+            changes = position_changes(old, items) if hasattr(old, 'names') else None
+            index = None
+            if changes is not None and not (changes[0] or changes[1]):
+                changes = None  # row for row the same file
+            elif changes is None or len(changes[0]) + len(changes[1]) > INCREMENTAL_LIMIT:
+                # Positions shifted (or most rows changed): a fresh index is cheaper
+                changes, index = None, SaleIndex(items)
+            self.reload_queue.put((items, diff, changes, index))
+        except Exception:
+            # Most likely caught mid-write; the write finishing is another change
+            self.reload_queue.put(None)
+
+    def _poll_reload(self):
+        try:
+            result = self.reload_queue.get_nowait()
+        except queue.Empty:
+            self.after(RELOAD_POLL_MS, self._poll_reload)
+            return
+        self.reload_thread = None
+        if result is not None:
+            self.apply_reload(*result)
+        if self.reload_again:
+            self.reload_again = False
+            self.reload_items(None)
+
+    @timed('apply_reload')
+    def apply_reload(self, items, diff, changes, index):
+        added, removed, modified = diff
+        if changes is None and index is None:
+            items.close()
+            return
+        selection = self.items_listbox.curselection()
+        selected_id = self.filtered_items[selection[0]]['id'] if selection else None
+        old_items = self.items
+        self.items = items
+        if index is not None:
+            self.index = index
+        else:
+            # Only the edited, added and removed rows are reindexed
+            self.index.apply_changes(items, *changes)
+        # Re-run the current search against the new listings in place; this
+        # also supersedes any refinement still running on the old ones
+        self.filter_generation += 1
+        query = self.last_query = self.active_query = self.current_query()
+        self.filtered_ids = self.index.search(*query)
+        self.filtered_items = [items[i] for i in self.filtered_ids]
+        self.update_listbox(keep_position=True)
+        if selected_id is not None:
+            for row, item in enumerate(self.filtered_items):
+                if item['id'] == selected_id:
+                    self.items_listbox.selection_set(row)
+                    self.show_item_details(None)
+                    break
+        if hasattr(old_items, 'close'):
+            old_items.close()
+        self.title(f'Sale Items Viewer ({len(added)} added, {len(removed)} removed, {len(modified)} changed)')
+
+    def open_stats_window(self):
+        from stats_window import StatsWindow
+        StatsWindow(self)
+
+    def on_close(self):
+        if self.watch is not None:
+            self.watch.stop()
+        if hasattr(self.items, 'close'):
+            self.items.close()
+        if self.client is not None:
+            self.client.close()
+        self.destroy()
+
     def create_widgets(self):
         # Search bar
         search_frame = ttk.Frame(self)
@@ -33,22 +147,22 @@ class SaleItemsViewer(tk.Tk):
         self.search_var = tk.StringVar()
         search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
         search_entry.pack(side='left', padx=5)
-        search_entry.bind('<KeyRelease>', self.update_filter)
+        search_entry.bind('<KeyRelease>', self.schedule_filter)
 
         ttk.Label(search_frame, text='Min Price:').pack(side='left', padx=(10,0))
         self.min_price_var = tk.StringVar()
         min_price_entry = ttk.Entry(search_frame, textvariable=self.min_price_var, width=7)
         min_price_entry.pack(side='left')
-        min_price_entry.bind('<KeyRelease>', self.update_filter)
+        min_price_entry.bind('<KeyRelease>', self.schedule_filter)
 
         ttk.Label(search_frame, text='Max Price:').pack(side='left', padx=(10,0))
         self.max_price_var = tk.StringVar()
         max_price_entry = ttk.Entry(search_frame, textvariable=self.max_price_var, width=7)
         max_price_entry.pack(side='left')
-        max_price_entry.bind('<KeyRelease>', self.update_filter)
+        max_price_entry.bind('<KeyRelease>', self.schedule_filter)
 
         # Listbox for items
-        self.items_listbox = tk.Listbox(self)
+        self.items_listbox = VirtualList(self)
         self.items_listbox.pack(fill='both', expand=True, padx=10, pady=5)
         self.items_listbox.bind('<<ListboxSelect>>', self.show_item_details)
 
@@ -62,7 +176,12 @@ class SaleItemsViewer(tk.Tk):
 
         self.update_listbox()
 
-    def update_filter(self, event=None):
+    def schedule_filter(self, event=None):
+        if self.filter_after_id is not None:
+            self.after_cancel(self.filter_after_id)
+        self.filter_after_id = self.after(FILTER_DELAY_MS, self.update_filter)
+
+    def current_query(self):
         name = self.search_var.get().lower()
         min_price = self.min_price_var.get()
         max_price = self.max_price_var.get()
@@ -74,25 +193,51 @@ class SaleItemsViewer(tk.Tk):
             max_price = float(max_price) if max_price else None
         except ValueError:
             max_price = None
-        self.filtered_items = []
-        for item in self.items:
-            if name and name not in item['name'].lower():
-                continue
-            try:
-                price = float(item['price'])
-            except Exception:
-                price = 0
-            if min_price is not None and price < min_price:
-                continue
-            if max_price is not None and price > max_price:
-                continue
-            self.filtered_items.append(item)
+        return name or None, min_price, max_price
+
+    @timed('update_filter')
+    def update_filter(self, event=None):
+        self.filter_after_id = None
+        query = self.current_query()
+        # Compared with the newest query, not the last finished one: typing
+        # and backspacing mid-refine must still cancel the refinement
+        if query == self.active_query:
+            return
+        # Any refinement still running belongs to an older query
+        self.filter_generation += 1
+        self.active_query = query
+        if self.client is not None:
+            self.last_query = query
+            self.filtered_items = self.client.sale_search(*query)
+            self.update_listbox()
+        elif narrows(self.last_query, query) and len(self.filtered_ids) <= REFINE_LIMIT:
+            self.refine_filter(self.filter_generation, query, self.filtered_ids, 0, [])
+        else:
+            self.finish_filter(query, self.index.search(*query))
+
+    @timed('refine_filter')
+    def refine_filter(self, generation, query, ids, start, matched):
+        # Narrowing query: filter the previous result a slice at a time so
+        # keystrokes are handled between slices
+        if generation != self.filter_generation:
+            return
+        end = start + REFINE_CHUNK
+        matched.extend(self.index.refine(ids[start:end], *query))
+        if end < len(ids):
+            self.after_idle(self.refine_filter, generation, query, ids, end, matched)
+        else:
+            self.finish_filter(query, matched)
+
+    def finish_filter(self, query, ids):
+        self.last_query = query
+        self.filtered_ids = ids
+        self.filtered_items = [self.items[i] for i in ids]
         self.update_listbox()
 
-    def update_listbox(self):
-        self.items_listbox.delete(0, tk.END)
-        for item in self.filtered_items:
-            self.items_listbox.insert(tk.END, f"{item['name']} (${item['price']})")
+    @timed('update_listbox')
+    def update_listbox(self, keep_position=False):
+        # Only the visible rows are drawn, however long the result list is
+        self.items_listbox.set_items(self.filtered_items, lambda item: f"{item['name']} (${item['price']})", keep_position)
         self.details_label.config(text='')
         self.image_label.config(image='')
         self.image_label.image = None
@@ -103,7 +248,19 @@ class SaleItemsViewer(tk.Tk):
             return
         idx = selection[0]
         item = self.filtered_items[idx]
-        details = f"ID: {item['id']}\nName: {item['name']}\nDescription: {item.get('description', 'N/A')}\nPrice: ${item['price']}"
+        try:
+            if self.client is not None:
+                # Result rows carry the columns only; the full listing is one request away
+                item = self.client.sale_item(item['index'])
+            description = item.get('description', 'N/A')
+        except (StaleSourceError, ServiceError):
+            # sale_items.json changed since it was indexed; the watcher (or,
+            # against the service, a fresh search) picks up the new listings
+            description = 'N/A (listings changed, reloading...)'
+            if self.client is not None:
+                self.last_query = self.active_query = None
+                self.schedule_filter()
+        details = f"ID: {item['id']}\nName: {item['name']}\nDescription: {description}\nPrice: ${item['price']}"
         self.details_label.config(text=details)
         # Show image if available
         img_path = os.path.join(IMAGE_DIR, item.get('image', ''))
@@ -121,6 +278,15 @@ class SaleItemsViewer(tk.Tk):
             self.image_label.config(image='')
             self.image_label.image = None
 
-if __name__ == '__main__':
-    app = SaleItemsViewer()
+def main(argv=None):
+    import argparse
+    from service_client import SERVER_ENV, ServiceClient, server_url
+    parser = argparse.ArgumentParser(description='Browse and search sale items.')
+    parser.add_argument('--server', help=f'catalog_service URL to search against (default: ${SERVER_ENV}, else {SALE_ITEMS_FILE})')
+    args = parser.parse_args(argv)
+    url = server_url(args.server)
+    app = SaleItemsViewer(ServiceClient(url) if url else None)
     app.mainloop()
+
+if __name__ == '__main__':
+    main()
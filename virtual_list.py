@@ -0,0 +1,132 @@
+import tkinter as tk
+
+from instrument import timed
+
+ROW_HEIGHT = 20
+SELECT_BG = '#3875d7'
+
+
+class VirtualList(tk.Frame):
+    # Listbox replacement that only creates canvas items for the visible rows.
+    # Rows come from any sequence; formatter turns one element into its text.
+    def __init__(self, master, row_height=ROW_HEIGHT, width=None, height=None, font=None):
+        super().__init__(master)
+        self.row_height = row_height
+        self.font = font
+        self.items = []
+        self.formatter = str
+        self.top = 0
+        self.selected = None
+        self.rows = []  # pooled (rect_id, text_id) pairs, one per visible slot
+        canvas_opts = {'bg': 'white', 'highlightthickness': 0}
+        if width:
+            canvas_opts['width'] = width * 7
+        if height:
+            canvas_opts['height'] = height * row_height
+        self.canvas = tk.Canvas(self, **canvas_opts)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas.bind('<Configure>', lambda e: self.redraw())
+        self.canvas.bind('<Button-1>', self.on_click)
+        self.canvas.bind('<MouseWheel>', lambda e: self.scroll(-1 if e.delta > 0 else 1, 'units'))
+        self.canvas.bind('<Button-4>', lambda e: self.scroll(-1, 'units'))
+        self.canvas.bind('<Button-5>', lambda e: self.scroll(1, 'units'))
+        self.canvas.bind('<Up>', lambda e: self.move_selection(-1))
+        self.canvas.bind('<Down>', lambda e: self.move_selection(1))
+        self.canvas.bind('<Prior>', lambda e: self.scroll(-1, 'pages'))
+        self.canvas.bind('<Next>', lambda e: self.scroll(1, 'pages'))
+
+    def set_items(self, items, formatter=None, keep_position=False):
+        self.items = items
+        if formatter is not None:
+            self.formatter = formatter
+        self.top = min(self.top, self.max_top()) if keep_position else 0
+        self.selected = None
+        self.redraw()
+
+    def size(self):
+        return len(self.items)
+
+    def curselection(self):
+        return () if self.selected is None else (self.selected,)
+
+    def selection_set(self, index):
+        self.selected = index
+        self.see(index)
+        self.redraw()
+
+    def visible_rows(self):
+        return max(1, self.canvas.winfo_height() // self.row_height)
+
+    def max_top(self):
+        return max(0, len(self.items) - self.visible_rows())
+
+    def yview(self, *args):
+        if not args:
+            return self.fractions()
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * len(self.items))
+        elif args[0] == 'scroll':
+            self.scroll(int(args[1]), args[2])
+            return
+        self.top = min(max(0, self.top), self.max_top())
+        self.redraw()
+
+    def scroll(self, amount, what='units'):
+        step = self.visible_rows() if what == 'pages' else 1
+        self.top = min(max(0, self.top + amount * step), self.max_top())
+        self.redraw()
+
+    def see(self, index):
+        rows = self.visible_rows()
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + rows:
+            self.top = index - rows + 1
+        self.top = min(max(0, self.top), self.max_top())
+
+    def fractions(self):
+        total = len(self.items)
+        if not total:
+            return 0.0, 1.0
+        return self.top / total, min(1.0, (self.top + self.visible_rows()) / total)
+
+    @timed('virtual_list.redraw')
+    def redraw(self):
+        rows = self.visible_rows() + 1
+        width = self.canvas.winfo_width()
+        while len(self.rows) < rows:
+            rect = self.canvas.create_rectangle(0, 0, 0, 0, width=0, fill='')
+            text = self.canvas.create_text(4, 0, anchor='nw', text='', font=self.font)
+            self.rows.append((rect, text))
+        for slot, (rect, text) in enumerate(self.rows):
+            index = self.top + slot
+            y = slot * self.row_height
+            if slot < rows and index < len(self.items):
+                label = self.formatter(self.items[index])
+                fill = SELECT_BG if index == self.selected else ''
+                color = 'white' if index == self.selected else 'black'
+            else:
+                label, fill, color = '', '', 'black'
+            self.canvas.coords(rect, 0, y, width, y + self.row_height)
+            self.canvas.itemconfigure(rect, fill=fill)
+            self.canvas.coords(text, 4, y + 2)
+            self.canvas.itemconfigure(text, text=label, fill=color)
+        self.scrollbar.set(*self.fractions())
+
+    def on_click(self, event):
+        self.canvas.focus_set()
+        index = self.top + event.y // self.row_height
+        if index < len(self.items):
+            self.selected = index
+            self.redraw()
+            self.event_generate('<<ListboxSelect>>')
+
+    def move_selection(self, delta):
+        if not self.items:
+            return
+        index = 0 if self.selected is None else self.selected + delta
+        index = min(max(0, index), len(self.items) - 1)
+        self.selection_set(index)
+        self.event_generate('<<ListboxSelect>>')